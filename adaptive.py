@@ -0,0 +1,49 @@
+from typing import Callable
+
+def is_changed(res1, res2, temp_rate: float) -> bool:
+    a, b = res1.result, res2.result
+    if a.mode != b.mode or a.power != b.power or a.fan != b.fan or a.profile != b.profile:
+        return True
+
+    dt = res2.sec - res1.sec
+    return temp_rate > 0 and dt > 0 and abs(b.temperature - a.temperature) / dt > temp_rate
+
+def refine(process: Callable[[list[float]], list], results: list, precision: float, temp_rate: float) -> list:
+    # bisect between neighbouring samples that differ until the change is found to the precision
+    found = {(res.result.panel, res.sec): res for res in results}
+
+    pending = []
+    panels = sorted(set([res.result.panel for res in results]))
+    for panel in panels:
+        samples = sorted([res for res in results if res.result.panel == panel], key=lambda res: res.sec)
+        pending.extend([(res1, res2) for res1, res2 in zip(samples, samples[1:]) if is_changed(res1, res2, temp_rate)])
+
+    while len(pending) > 0:
+        pending = [(res1, res2) for res1, res2 in pending if res2.sec - res1.sec > precision]
+        mids = sorted(set([round((res1.sec + res2.sec) / 2, 3) for res1, res2 in pending]))
+        if len(mids) == 0:
+            break
+
+        # one batch per bisection round, every pending change is refined with a single pass
+        refined = process(mids)
+        for res in refined:
+            found[(res.result.panel, res.sec)] = res
+
+        next_pending = []
+        for res1, res2 in pending:
+            # results carry the time of the decoded frame, which can be after the requested one
+            between = [res for res in refined if res.result.panel == res1.result.panel and res1.sec < res.sec < res2.sec]
+            if len(between) == 0:
+                continue
+
+            mid_sec = (res1.sec + res2.sec) / 2
+            mid = min(between, key=lambda res: abs(res.sec - mid_sec))
+
+            if is_changed(res1, mid, temp_rate):
+                next_pending.append((res1, mid))
+            if is_changed(mid, res2, temp_rate):
+                next_pending.append((mid, res2))
+
+        pending = next_pending
+
+    return sorted(found.values(), key=lambda res: (res.sec, res.result.panel))
@@ -1,8 +1,9 @@
+import bisect
 
 import cv2
 from context import FrameContext
 from debug import _debug
-from utils import Rect
+from utils import Rect, find_boxes
 
 class AOI:
     def __init__(self, rect: Rect):
@@ -17,22 +18,14 @@ class AOI:
         newY2 = max(self.rect.y2(), rect.y2())
         newH = newY2 - newY
         self.rect = Rect([newX, newY, newW, newH])
-        self.items.append(rect)
-        self.items = sorted(self.items, key=lambda item: item.x)
+        # the items stay sorted, insert instead of sorting again
+        bisect.insort(self.items, rect, key=lambda item: item.x)
 
 
-def find_aoi(ctx: FrameContext, image: cv2.Mat, minArea: int = 50, xThreshold: int = 100) -> list:
-    def filter_area(contours):
-        for c in contours:
-            if cv2.contourArea(c) > minArea:
-                yield c
-
-    contours, _ = cv2.findContours( 
-        image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE) 
-
-    contours = filter_area(contours)
-
-    boxes = [cv2.boundingRect(c) for c in contours]
+def find_aoi(ctx: FrameContext, image: cv2.Mat, minArea: int = 50, xThreshold: int = 100, boxes: list = None) -> list:
+    # boxes from an earlier contour search skip the search
+    if boxes is None:
+        boxes = find_boxes(image, minArea)
     
     def is_same_row(rect1: Rect, rect2: Rect) -> bool:
         return (rect2.y <= rect1.y and rect1.y <= rect2.y2()) or \
@@ -46,9 +39,8 @@ def find_aoi(ctx: FrameContext, image: cv2.Mat, minArea: int = 50, xThreshold: i
     boxes = sorted(boxes, key=lambda b: b[1])  
 
     def __debug_boxes():
-        img = ctx.image.copy()
-        [cv2.rectangle(img, box, (255,255,255), 1) for box in boxes]
-        ctx._write_step("boxes", img)
+        layer = ctx._layer('boxes')
+        [layer.rect(box, (255,255,255), 1) for box in boxes]
 
     _debug(ctx, lambda: __debug_boxes())
 
@@ -69,17 +61,15 @@ def find_aoi(ctx: FrameContext, image: cv2.Mat, minArea: int = 50, xThreshold: i
     aoi_rows.append(cur_row)
 
     def __debug_rows():
-        img = ctx.image.copy()
+        layer = ctx._layer('rows')
         for i, row in enumerate(aoi_rows):
-            cv2.rectangle(img, row.rect.to_list(), (255,255,255), 2)
-            [cv2.rectangle(img, rect.to_list(), (0,255,255), 1) for rect in row.items]
-            cv2.putText(img, f'row-{i}', [row.rect.x, row.rect.y - 20], cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 2)
+            layer.rect(row.rect.to_list(), (255,255,255), 2)
+            [layer.rect(rect.to_list(), (0,255,255), 1) for rect in row.items]
+            layer.text(f'row-{i}', [row.rect.x, row.rect.y - 20], (255,255,255), 0.5, 2)
              
             for i, rect in enumerate(row.items):
                 offset = 20 * i
-                cv2.putText(img, f'{rect.x}, {rect.y} {rect.x2()}, {rect.y2()}', [rect.x, rect.y + offset], cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 1)
-
-        ctx._write_step("rows", img)
+                layer.text(f'{rect.x}, {rect.y} {rect.x2()}, {rect.y2()}', [rect.x, rect.y + offset], (255,255,255), 0.5, 1)
 
     _debug(ctx, lambda: __debug_rows())
 
@@ -105,13 +95,11 @@ def find_aoi(ctx: FrameContext, image: cv2.Mat, minArea: int = 50, xThreshold: i
         aois.append(cur_aoi)
 
     def __debug_aois():
-        img = ctx.image.copy()
+        layer = ctx._layer('aois')
         for i, aoi in enumerate(aois):
-            cv2.rectangle(img, aoi.rect.to_list(), (255,255,255), 2)
-            [cv2.rectangle(img, rect.to_list(), (0,255,255), 1) for rect in aoi.items]
-            cv2.putText(img, f'aoi-{i}', [aoi.rect.x, aoi.rect.y - 20], cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,255,255), 2)
-        
-        ctx._write_step("aois", img)
+            layer.rect(aoi.rect.to_list(), (255,255,255), 2)
+            [layer.rect(rect.to_list(), (0,255,255), 1) for rect in aoi.items]
+            layer.text(f'aoi-{i}', [aoi.rect.x, aoi.rect.y - 20], (255,255,255), 0.5, 2)
 
     _debug(ctx, lambda: __debug_aois())
 
@@ -0,0 +1,173 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+from main import Result2, new_parser, run_pipeline
+
+FIELDS = ['temperature', 'time', 'power', 'fan', 'profile', 'mode']
+VIDEO_EXTS = ['.mp4', '.mov', '.avi', '.mkv']
+
+class Clip:
+    def __init__(self, name: str, input_path: str, expected_path: str):
+        self.name = name
+        self.input_path = input_path
+        self.expected_path = expected_path
+
+def find_clips(corpus_path: str) -> list[Clip]:
+    # a clip is a video or a frame folder with an expected results csv of the same name
+    clips: list[Clip] = []
+    for entry in sorted(os.listdir(corpus_path)):
+        name, ext = os.path.splitext(entry)
+        input_path = os.path.join(corpus_path, entry)
+
+        if not os.path.isdir(input_path) and not ext.lower() in VIDEO_EXTS:
+            continue
+
+        expected_path = os.path.join(corpus_path, f'{name}.csv')
+        if not os.path.isfile(expected_path):
+            print(f'{entry} - expected results {expected_path} not found, skipped')
+            continue
+
+        clips.append(Clip(name, input_path, expected_path))
+
+    return clips
+
+def read_expected(path: str) -> dict[tuple[str, int], dict[str, str]]:
+    # multi panel clips add a panel column
+    expected: dict[tuple[str, int], dict[str, str]] = {}
+    with open(path, 'r') as f:
+        rdr = csv.reader(f, delimiter=',')
+        header = [col.strip() for col in next(rdr)]
+        for row in rdr:
+            values = dict(zip(header, [col.strip() for col in row]))
+            expected[(values['name'], int(values.get('panel') or 0))] = values
+
+    return expected
+
+def score_clip(expected: dict[tuple[str, int], dict[str, str]], results: list[Result2]) -> dict[str, list[int]]:
+    actual = {(res.result.name, res.result.panel): res.result for res in results}
+
+    scores = {field: [0, 0] for field in FIELDS}
+    for key, values in expected.items():
+        res = actual.get(key)
+        for field in FIELDS:
+            if not field in values:
+                continue
+
+            scores[field][1] += 1
+            if res is not None and str(getattr(res, field)) == values[field]:
+                scores[field][0] += 1
+
+    return scores
+
+def run(args: argparse.Namespace) -> dict:
+    clips = find_clips(args.input_path)
+    if len(clips) == 0:
+        raise ValueError(f'no clips found in corpus: {args.input_path}')
+
+    totals = {field: [0, 0] for field in FIELDS}
+    latencies: list[int] = []
+    wall = 0.0
+
+    for clip in clips:
+        clip_args = argparse.Namespace(**vars(args))
+        clip_args.input_path = clip.input_path
+        clip_args.output_path = os.path.join(args.output_path, clip.name)
+
+        # the same setup as main.py, caches, index, workers and all
+        t1 = time.time()
+        ran = run_pipeline(clip_args)
+        wall += time.time() - t1
+        if ran is None:
+            raise ValueError(f'clip {clip.name} could not be processed')
+
+        context, results = ran
+
+        expected = read_expected(clip.expected_path)
+        scores = score_clip(expected, results)
+        for field, (correct, total) in scores.items():
+            totals[field][0] += correct
+            totals[field][1] += total
+
+        latencies.extend(context.frame_times)
+        print(f'{clip.name}: {len(results)}/{len(expected)} frames, ' +
+              ', '.join([f'{field}: {correct}/{total}' for field, (correct, total) in scores.items()]))
+
+    # every sampled frame counts, failed frames are usually the slowest
+    return {
+        'accuracy': {field: round(correct / total, 4) if total > 0 else None for field, (correct, total) in totals.items()},
+        'frames': len(latencies),
+        'fps': round(len(latencies) / wall, 3) if wall > 0 else 0,
+        'p50': float(np.percentile(latencies, 50)) if len(latencies) > 0 else 0,
+        'p95': float(np.percentile(latencies, 95)) if len(latencies) > 0 else 0,
+    }
+
+def compare(report: dict, baseline: dict, accuracy_tolerance: float, speed_tolerance: float) -> list[str]:
+    regressions: list[str] = []
+
+    for field in FIELDS:
+        cur = report['accuracy'].get(field)
+        base = baseline['accuracy'].get(field)
+        if cur is None or base is None:
+            continue
+
+        if cur < base - accuracy_tolerance:
+            regressions.append(f'{field} accuracy {cur} < baseline {base}')
+
+    if report['fps'] < baseline['fps'] * (1 - speed_tolerance):
+        regressions.append(f'fps {report["fps"]} < baseline {baseline["fps"]}')
+
+    for key in ['p50', 'p95']:
+        if report[key] > baseline[key] * (1 + speed_tolerance):
+            regressions.append(f'{key} latency {report[key]} > baseline {baseline[key]}')
+
+    return regressions
+
+def main(args):
+    if not os.path.isdir(args.input_path):
+        print(f"corpus directory not found: {args.input_path}")
+        return 1
+
+    shutil.rmtree(args.output_path, ignore_errors=True)
+    os.makedirs(args.output_path, exist_ok=True)
+
+    # paddle is initialized by the pipeline, with the same threads as a normal run
+    report = run(args)
+    print(json.dumps(report, indent=2))
+
+    with open(os.path.join(args.output_path, 'benchmark.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'baseline written to {args.baseline}')
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print(f'baseline {args.baseline} not found, nothing to compare')
+        return 0
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+
+    regressions = compare(report, baseline, args.accuracy_tolerance, args.speed_tolerance)
+    for regression in regressions:
+        print(f'REGRESSION: {regression}')
+
+    return 1 if len(regressions) > 0 else 0
+
+if __name__ == "__main__":
+    parser = new_parser("Run the pipeline on a golden corpus and compare accuracy and throughput against a baseline.")
+    parser.add_argument('--baseline', type=str, default='baseline.json', required=False, help="Baseline report to compare against.")
+    parser.add_argument('--save-baseline', type=bool, default=False, required=False, help="Write this run as the new baseline.")
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.0, required=False, help="Allowed accuracy drop per field.")
+    parser.add_argument('--speed-tolerance', type=float, default=0.1, required=False, help="Allowed relative fps / latency regression.")
+
+    sys.exit(main(parser.parse_args()))
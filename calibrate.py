@@ -0,0 +1,98 @@
+import os
+import shutil
+from typing import Optional
+import cv2
+
+from calibration import Calibration, CalibrationSample
+from context import Context
+from main import get_degrees, new_parser
+from ocr import OCR
+from resources import ResourceManager
+from skywalker import SkyWalker
+from utils import rotate_image
+
+def sample_frame(ctx: Context, name: str, frame: cv2.Mat) -> Optional[CalibrationSample]:
+    fctx = ctx.new_frame_context(name, frame)
+
+    for degree in get_degrees(fctx):
+        image = rotate_image(frame, degree)
+        fctx.image = image
+        fctx.rotation = degree
+
+        skywalker = SkyWalker(fctx)
+        if ctx.options.panel:
+            res = skywalker.detect_panel()
+        else:
+            res = skywalker.detect()
+
+        # one composited debug image per rotation attempt
+        fctx._render_overlay()
+
+        if res is None or not 'POWER' in skywalker.displays:
+            continue
+
+        height, width = image.shape[:2]
+        rects = {key: display.rect for key, display in skywalker.displays.items()}
+        return CalibrationSample(degree, width, height, rects)
+
+    return None
+
+def calibrate(ctx: Context, frames: int) -> Calibration:
+    video = cv2.VideoCapture(ctx.settings.input_path)
+    if not video.isOpened():
+        raise ValueError(f"Cannot open video file: {ctx.settings.input_path}")
+
+    cur_sec = ctx.options.skip
+    num_frames = ctx.options.count
+
+    samples: list[CalibrationSample] = []
+    while len(samples) < frames:
+        video.set(cv2.CAP_PROP_POS_MSEC, cur_sec * 1000)
+        ret, frame = video.read()
+
+        if not ret:
+            break
+
+        sample = sample_frame(ctx, f"frame_{cur_sec}", frame)
+        if sample is not None:
+            samples.append(sample)
+        else:
+            print(f'frame_{cur_sec} - skywalker display not found, skipped')
+
+        if ctx.options.count > 0:
+            num_frames = num_frames - 1
+            if num_frames == 0:
+                break
+
+        cur_sec += ctx.options.interval
+
+    video.release()
+
+    return Calibration.fit(samples)
+
+def main(args):
+    if not os.path.isfile(args.input_path):
+        print(f"input file not found: {args.input_path}")
+        return
+
+    shutil.rmtree(args.output_path, ignore_errors=True)
+    os.makedirs(args.output_path, exist_ok=True)
+
+    # same paddle threads as a single worker run
+    OCR(ResourceManager.configure(ResourceManager(1, args.pin).allocate()[0], args.pin), args.ocr_pool)
+
+    context = Context(args)
+    # always run the full layout search while calibrating
+    context.layout = None
+
+    calibration = calibrate(context, args.frames)
+
+    out_file = os.path.join(args.output_path, 'calibration.json')
+    calibration.save(out_file)
+    print(f'calibration profile written to {out_file}')
+
+if __name__ == "__main__":
+    parser = new_parser("Fit the display layout and rotation of a rig and save it as a calibration profile.")
+    parser.add_argument('--frames', type=int, default=5, required=False, help="Number of good frames to fit.")
+
+    main(parser.parse_args())
@@ -0,0 +1,89 @@
+import json
+import math
+from collections import Counter
+from typing import Tuple
+
+import numpy as np
+
+from utils import Rect, calculate_angle
+
+class CalibrationSample:
+    def __init__(self, rotate: int, width: int, height: int, rects: dict[str, Rect]):
+        self.rotate = rotate
+        self.width = width
+        self.height = height
+        self.rects = rects
+
+class Calibration:
+    def __init__(self, rotate: int, width: int, height: int, rects: dict[str, Rect], sections: dict[str, Tuple[float, float]]):
+        self.rotate = rotate
+        self.width = width
+        self.height = height
+        self.rects = rects
+        self.sections = sections
+
+    @staticmethod
+    def load(path: str):
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        rects: dict[str, Rect] = {}
+        sections: dict[str, Tuple[float, float]] = {}
+        for name, display in data['displays'].items():
+            rects[name] = Rect(display['rect'])
+            sections[name] = (display['angle'], display['length'])
+
+        return Calibration(data['rotate'], data['width'], data['height'], rects, sections)
+
+    def save(self, path: str):
+        displays = {}
+        for name, rect in self.rects.items():
+            angle, length = self.sections[name]
+            displays[name] = {'rect': rect.to_list(), 'angle': angle, 'length': length}
+
+        data = {
+            'rotate': self.rotate,
+            'width': self.width,
+            'height': self.height,
+            'displays': displays,
+        }
+
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    @staticmethod
+    def fit(samples: list[CalibrationSample]):
+        if len(samples) == 0:
+            raise ValueError('no calibration samples')
+
+        # use the frames with the most common rotation and frame size
+        rotate, width, height = Counter([(s.rotate, s.width, s.height) for s in samples]).most_common(1)[0][0]
+        samples = [s for s in samples if s.rotate == rotate and s.width == width and s.height == height]
+
+        names = []
+        for sample in samples:
+            names.extend([name for name in sample.rects.keys() if not name in names])
+
+        rects: dict[str, Rect] = {}
+        for name in names:
+            boxes = np.array([sample.rects[name].to_list() for sample in samples if name in sample.rects])
+            rects[name] = Rect([int(v) for v in np.median(boxes, axis=0)])
+
+        if not 'POWER' in rects:
+            raise ValueError('power display not found in calibration samples')
+
+        # angle and length ratio from the power display, same measure as calculate_projection
+        power = rects['POWER']
+        center1 = power.projected().center()
+
+        sections: dict[str, Tuple[float, float]] = {}
+        for name, rect in rects.items():
+            if name == 'POWER':
+                sections[name] = (0.0, 0.0)
+                continue
+
+            center2 = rect.projected().center()
+            line_length = math.sqrt((center2[0] - center1[0]) ** 2 + (center2[1] - center1[1]) ** 2)
+            sections[name] = (round(calculate_angle(center1, center2), 2), round(line_length / power.h, 2))
+
+        return Calibration(rotate, width, height, rects, sections)
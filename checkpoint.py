@@ -0,0 +1,64 @@
+import glob
+import json
+import os
+from typing import Callable, Optional
+
+CHECKPOINT_FILE = 'checkpoint.json'
+RESULT_FILES = 'results*.csv'
+
+class Checkpoint:
+    def __init__(self, output_path: str, every: int, write: Callable[[list], None], last_sec: Optional[float] = None, frames: int = 0):
+        self.output_path = output_path
+        self.every = every
+        self.last_sec = last_sec
+        self.frames = frames
+
+        self.__write = write
+        self.__pending = []
+        self.__pending_frames = 0
+
+    @staticmethod
+    def load(output_path: str) -> Optional[dict]:
+        path = os.path.join(output_path, CHECKPOINT_FILE)
+        if not os.path.isfile(path):
+            return None
+
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        # drop rows appended after the checkpoint was taken
+        for result_file in glob.glob(os.path.join(output_path, RESULT_FILES)):
+            size = data['files'].get(os.path.basename(result_file))
+            if size is None:
+                os.remove(result_file)
+            else:
+                os.truncate(result_file, size)
+
+        return data
+
+    def add(self, sec: float, results: list, frames: int = 1):
+        self.__pending.extend(results)
+        self.__pending_frames += frames
+        self.last_sec = sec
+
+        if self.__pending_frames >= self.every:
+            self.flush()
+
+    def flush(self):
+        if self.__pending_frames == 0:
+            return
+
+        self.__write(self.__pending)
+        self.frames += self.__pending_frames
+        self.__pending = []
+        self.__pending_frames = 0
+
+        files = {os.path.basename(result_file): os.path.getsize(result_file)
+                 for result_file in glob.glob(os.path.join(self.output_path, RESULT_FILES))}
+        data = {'last_sec': self.last_sec, 'frames': self.frames, 'files': files}
+
+        # atomic replace, a crash never leaves a half written checkpoint
+        path = os.path.join(self.output_path, CHECKPOINT_FILE)
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(f'{path}.tmp', path)
@@ -1,7 +1,19 @@
 import csv
+import io
 import os
+import sys
+import threading
 import cv2
 import argparse
+from collections import deque
+from typing import Optional
+
+from calibration import Calibration
+from layout import PanelLayout, PanelTracker
+from overlay import Layer, Overlay
+from predict import Predictor
+from roicache import ROICacheWriter
+from tiles import TileTracker
 
 class Settings:
     def __init__(self, input_path: str, output_path: str):
@@ -17,26 +29,143 @@ class Options:
         self.debug = args.debug
         self.panel = args.panel
         self.training = args.training 
+        self.panels = args.panels
+        self.redetect = args.redetect
+        self.calibration = args.calibration
+        self.profile = args.profile
+        self.profile_threshold = args.profile_threshold
+        self.roi_cache = args.roi_cache
+        self.replay = args.replay
+        self.resume = args.resume
+        self.idle_skip = args.idle_skip
+        self.predict = args.predict
+        self.debug_ring = args.debug_ring
+        self.image_order = args.image_order
+        self.prefetch = args.prefetch
+        self.ffmpeg = args.ffmpeg
+        self.crop = args.crop
+        self.scale_width = args.scale_width
+        self.quality_window = args.quality_window
+        self.min_sharpness = args.min_sharpness
+        self.incremental = args.incremental
+        self.frame_index = args.frame_index
+        self.debug_layers = [layer for layer in args.debug_layers.split(',') if layer != '']
+
+class ThreadStdout:
+    # stdout for the calling thread only, the other threads keep printing to the console
+    __installed: 'ThreadStdout' = None
+    __install_lock = threading.Lock()
+
+    def __init__(self, out):
+        self.__out = out
+        self.__local = threading.local()
+
+    def __target(self):
+        target = getattr(self.__local, 'target', None)
+        return target if target is not None else self.__out
+
+    def write(self, text: str) -> int:
+        return self.__target().write(text)
+
+    def flush(self):
+        self.__target().flush()
+
+    def __getattr__(self, name: str):
+        return getattr(self.__out, name)
+
+    @classmethod
+    def capture(cls, target: io.StringIO, fn):
+        with cls.__install_lock:
+            if cls.__installed is None or sys.stdout is not cls.__installed:
+                cls.__installed = ThreadStdout(sys.stdout)
+                sys.stdout = cls.__installed
+
+        local = cls.__installed.__local
+        previous = getattr(local, 'target', None)
+        local.target = target
+        try:
+            fn()
+        finally:
+            local.target = previous
 
 class FrameContext:
-    def __init__(self, name: str, image: cv2.Mat, options: Options, debug_path: str):
+    def __init__(self, name: str, image: cv2.Mat, options: Options, debug_path: str, 
+                 layout: PanelLayout = None, calibration: Calibration = None, 
+                 sec: float = 0, roi_cache: ROICacheWriter = None, predictor: Predictor = None,
+                 tiles: TileTracker = None, panels: PanelTracker = None, time: Optional[float] = None):
         self.name = name
         self.options = options
         self.image = image
+        self.layout = layout
+        self.calibration = calibration
+        self.sec = sec
+        # presentation time of the frame, the sampled second is the key
+        self.time = time if time is not None else sec
+        self.roi_cache = roi_cache
+        self.predictor = predictor
+        self.tiles = tiles
+        self.panels = panels
+        # rotation of the current detection attempt
+        self.rotation = 0
 
         self.__step_counter = 1
+        self.__step_lock = threading.RLock()
+
+        # failure capture keeps the steps in memory until the frame is known to fail
+        self.failures: list[str] = []
+        self.steps: list[tuple[str, bytes]] = []
+        self.log = io.StringIO()
 
+        # debug annotations, rendered once per frame by the compositor
+        self.overlay = Overlay()
+
+        self.__debug_dir = os.path.join(debug_path, name)
         if self.options.debug:
-            self.__debug_dir = os.path.join(debug_path, name)
             os.makedirs(self.__debug_dir, exist_ok=True)
 
+    def capturing(self) -> bool:
+        return not self.options.debug and self.options.debug_ring > 0
+
+    def fail(self, reason: str):
+        self.failures.append(reason)
+
+    def _capture(self, fn):
+        with self.__step_lock:
+            ThreadStdout.capture(self.log, fn)
+
+    def _layer(self, name: str) -> Layer:
+        with self.__step_lock:
+            return self.overlay.layer(name)
+
+    def _render_overlay(self):
+        if self.overlay.empty():
+            return
+
+        img = self.overlay.render(self.image, self.options.debug_layers)
+        if img is not None:
+            self._write_step('overlay', img)
+
+        self.overlay.clear()
+
     def _write_step(self, filename: str, image: cv2.Mat):
-        if not self.options.debug:
+        if not self.options.debug and not self.capturing():
             return
 
-        output_path = os.path.join(self.__debug_dir, f'{self.__step_counter}-{filename}.png')
+        # panels of the same frame write their steps from worker threads
+        with self.__step_lock:
+            step = self.__step_counter
+            self.__step_counter += 1
+
+        if self.capturing():
+            _, data = cv2.imencode('.png', image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            self.steps.append((f'{step}-{filename}.png', data.tobytes()))
+            return
+
+        output_path = os.path.join(self.__debug_dir, f'{step}-{filename}.png')
         cv2.imwrite(output_path, image)
-        self.__step_counter += 1
+
+    def _captured(self) -> tuple[str, list[tuple[str, bytes]], str]:
+        return self.__debug_dir, self.steps, '\n'.join(self.failures + [self.log.getvalue()])
 
     
 class Context:
@@ -47,9 +176,72 @@ class Context:
         os.makedirs(self.settings.output_path, exist_ok=True)
 
         self.__debug_path = ''
-        if self.options.debug:
+        if self.options.debug or self.options.debug_ring > 0:
             self.__debug_path = os.path.join(self.settings.output_path, '_debug')
+
+        self.layout = PanelLayout(self.options.redetect)
+
+        self.debug_ring = None
+        if not self.options.debug and self.options.debug_ring > 0:
+            self.debug_ring = DebugRing(self.options.debug_ring)
+
+        # live result sink and checkpoint, owned by the main process
+        self.publisher = None
+        self.checkpoint = None
+        # msec of every processed frame, with or without a reading
+        self.frame_times: list[int] = []
+        # ocr cache hits and misses of the worker processes
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.roi_cache = None
+        if self.options.roi_cache and not self.options.replay:
+            self.roi_cache = ROICacheWriter(self.options.roi_cache, self.options.resume)
+
+        # predicted readings are not used as training labels
+        self.predictor = None
+        if self.options.predict and not self.options.training:
+            self.predictor = Predictor()
+
+        self.panels = None
+        if self.options.panels > 1:
+            self.panels = PanelTracker(self.options.panels)
+
+        # image sequence input, listed on first use
+        self.sequence = None
+
+        self.tiles = None
+        if self.options.incremental:
+            self.tiles = TileTracker()
+
+        self.calibration = None
+        if self.options.calibration:
+            self.calibration = Calibration.load(self.options.calibration)
+            self.layout.pin(self.calibration.rects, self.calibration.width, self.calibration.height, self.calibration.rotate)
         
 
-    def new_frame_context(self, name: str, image: cv2.Mat):
-        return FrameContext(name, image, self.options, self.__debug_path)
+    def new_frame_context(self, name: str, image: cv2.Mat, sec: float = 0, time: Optional[float] = None):
+        return FrameContext(name, image, self.options, self.__debug_path, self.layout, self.calibration, 
+                            sec, self.roi_cache, self.predictor, self.tiles, self.panels, time)
+
+class DebugRing:
+    def __init__(self, size: int):
+        self.size = size
+        # only the encoded steps are kept, not the frame images
+        self.__frames = deque(maxlen=size)
+
+    def commit(self, ctx: FrameContext, failed: bool):
+        self.__frames.append(ctx._captured())
+
+        # write the frames leading up to a failure, then start over
+        if failed:
+            for debug_dir, steps, log in self.__frames:
+                os.makedirs(debug_dir, exist_ok=True)
+                for filename, data in steps:
+                    with open(os.path.join(debug_dir, filename), 'wb') as f:
+                        f.write(data)
+
+                with open(os.path.join(debug_dir, 'log.txt'), 'w') as f:
+                    f.write(log)
+
+            self.__frames.clear()
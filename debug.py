@@ -6,26 +6,27 @@ from cv2 import Mat
 import cv2
 from utils import Rect
 from context import FrameContext
-from utils import calculate_angle, find_central_box_index, midpoint
+from overlay import Layer
+from utils import RectArray, calculate_angle, find_central_box_index, midpoint
 
 def _debug_projection(ctx: FrameContext, rects: list[Rect]):
-    img = ctx.image.copy()
+    layer = ctx._layer('projection')
     color: cv2.typing.Scalar = (255, 255, 255)
     color2: cv2.typing.Scalar = (0, 255, 255)
 
     cidx = find_central_box_index(rects)
     rect1 = rects[cidx]
-    projected_rect1 = rect1.projected()
-    center1 = projected_rect1.center()
-    for rect2 in rects:
-        cv2.rectangle(img, rect2.to_list(), color, 2) 
-        projected_rect = rect2.projected()
-        cv2.rectangle(img, projected_rect.to_list(), color2, 1) 
+
+    projected = RectArray(rects).projected()
+    centers = projected.centers().tolist()
+    center1 = centers[cidx]
+    for rect2, projected_box, center2 in zip(rects, projected.boxes.tolist(), centers):
+        layer.rect(rect2.to_list(), color, 2) 
+        layer.rect(projected_box, color2, 1) 
 
         if rect2 == rect1:
             continue
 
-        center2 = projected_rect.center()
         line_length = int(math.sqrt((center2[0] - center1[0]) ** 2 + (center2[1] - center1[1]) ** 2))
         ratio = round(line_length / rect1.h, 2)
         angle = round(calculate_angle(center1, center2), 2)
@@ -34,20 +35,18 @@ def _debug_projection(ctx: FrameContext, rects: list[Rect]):
 
         mid_pt = midpoint(center1, center2)
 
-        cv2.line(img, center1, center2, color2, 1)
-        cv2.putText(img, text, mid_pt, cv2.FONT_HERSHEY_SIMPLEX, 0.5, color2, 1)
-
-    ctx._write_step("projection", img)
+        layer.line(center1, center2, color2, 1)
+        layer.text(text, mid_pt, color2, 0.5, 1)
 
-def _write_box(img: cv2.Mat, rect: Rect, name:str, color: cv2.typing.Scalar): 
-    cv2.rectangle(img, rect.to_list(), color, 1)
+def _write_box(layer: Layer, rect: Rect, name:str, color: cv2.typing.Scalar): 
+    layer.rect(rect.to_list(), color, 1)
 
     if name != '':
         text = f'{name}, A:{rect.area()}, P:[{rect.x}, {rect.y}], D:[{rect.w}x{rect.h}]'
-        cv2.putText(img, text, [rect.x, rect.y - 20], cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        layer.text(text, [rect.x, rect.y - 20], color, 0.5, 2)
 
 def _debug_displays(ctx: FrameContext, rects: dict[str, Rect]):
-    img = ctx.image.copy()
+    layer = ctx._layer('displays')
     color: cv2.typing.Scalar = (255, 255, 188)
 
     rect = rects["POWER"]
@@ -55,7 +54,7 @@ def _debug_displays(ctx: FrameContext, rects: dict[str, Rect]):
     center1 = rect.projected().center()
 
     for name, rect2 in rects.items():
-        _write_box(img, rect2, name, color)
+        _write_box(layer, rect2, name, color)
 
         if name == "POWER":
             continue
@@ -69,11 +68,11 @@ def _debug_displays(ctx: FrameContext, rects: dict[str, Rect]):
 
         mid_pt = midpoint(center1, center2)
 
-        cv2.line(img, center1, center2, color, 2)
-        cv2.putText(img, text, mid_pt, cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-    ctx._write_step('displays', img)
+        layer.line(center1, center2, color, 2)
+        layer.text(text, mid_pt, color, 0.5, 2)
 
 def _debug(ctx: FrameContext, fn: Callable):
     if ctx.options.debug:
         fn()
+    elif ctx.capturing():
+        ctx._capture(fn)
@@ -18,19 +18,25 @@ class Digit:
         self.max_width = -1
         
 class Display:
-    def __init__(self, ctx: FrameContext, name: str, rect: Rect, digits: list[Digit]):
+    def __init__(self, ctx: FrameContext, name: str, rect: Rect, digits: list[Digit], image: cv2.Mat = None):
         self.ctx = ctx
         self.name = name
         self.rect = rect
         self.digits  = digits
         self.skip_detect = False
         
-        self.__extract_image()
+        if image is not None:
+            self.__image = image
+        else:
+            self.__extract_image()
 
 
     def __extract_image(self):
         self.__image = self.rect.extract_image(self.ctx.image)
 
+    def get_image(self) -> cv2.Mat:
+        return self.__image
+
     def get_max_digit_size(self) -> Tuple[int, int]:
         max_w = 0
         max_h = 0
@@ -0,0 +1,212 @@
+import bisect
+import json
+import os
+import shutil
+import subprocess
+from typing import Optional
+
+import cv2
+
+INDEX_VERSION = 1
+
+def index_path(path: str) -> str:
+    return f'{path}.frames.json'
+
+class FrameIndex:
+    def __init__(self, pts: list[float], keyframes: Optional[list[int]], size: int = 0, mtime: float = 0):
+        # presentation timestamps in display order, from the first frame
+        self.pts = pts
+        # display order positions of the keyframes, none when the container did not tell
+        self.keyframes = keyframes
+        self.size = size
+        self.mtime = mtime
+
+    def find(self, sec: float) -> Optional[int]:
+        # the first frame shown at or after the timestamp
+        idx = bisect.bisect_left(self.pts, sec - 0.0005)
+        if idx >= len(self.pts):
+            return None
+
+        return idx
+
+    def nearest(self, sec: float) -> int:
+        # the frame closest to a decoder timestamp
+        idx = bisect.bisect_left(self.pts, sec)
+        if idx >= len(self.pts):
+            return len(self.pts) - 1
+        if idx > 0 and sec - self.pts[idx - 1] < self.pts[idx] - sec:
+            return idx - 1
+
+        return idx
+
+    def keyframe(self, idx: int) -> Optional[int]:
+        if not self.keyframes:
+            return None
+
+        pos = bisect.bisect_right(self.keyframes, idx) - 1
+        return self.keyframes[max(0, pos)]
+
+    def timestamp(self, idx: int) -> float:
+        return round(self.pts[min(idx, len(self.pts) - 1)], 3)
+
+    @staticmethod
+    def load(path: str) -> Optional['FrameIndex']:
+        sidecar = index_path(path)
+        if not os.path.isfile(sidecar):
+            return None
+
+        with open(sidecar, 'r') as f:
+            data = json.load(f)
+
+        # a re-encoded or replaced video needs a new index
+        stat = os.stat(path)
+        if data.get('version') != INDEX_VERSION or data['size'] != stat.st_size or data['mtime'] != stat.st_mtime:
+            return None
+
+        return FrameIndex(data['pts'], data['keyframes'], data['size'], data['mtime'])
+
+    def save(self, path: str):
+        with open(index_path(path), 'w') as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'size': self.size,
+                'mtime': self.mtime,
+                'keyframes': self.keyframes,
+                'pts': self.pts,
+            }, f)
+
+    @staticmethod
+    def build(path: str) -> 'FrameIndex':
+        stat = os.stat(path)
+        if shutil.which('ffprobe') is not None:
+            pts, keyframes = FrameIndex.__probe(path)
+        else:
+            pts, keyframes = FrameIndex.__scan(path)
+
+        return FrameIndex(pts, keyframes, stat.st_size, stat.st_mtime)
+
+    @staticmethod
+    def ensure(path: str) -> 'FrameIndex':
+        index = FrameIndex.load(path)
+        if index is None:
+            index = FrameIndex.build(path)
+            index.save(path)
+            print(f'indexed {len(index.pts)} frames, {len(index.keyframes or [])} keyframes: {index_path(path)}')
+
+        return index
+
+    @staticmethod
+    def __probe(path: str) -> tuple[list[float], list[int]]:
+        # packet headers only, nothing is decoded
+        out = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                              '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path],
+                             capture_output=True, check=True, text=True).stdout
+
+        packets = []
+        for line in out.splitlines():
+            fields = line.split(',')
+            if len(fields) < 2 or fields[0] in ('', 'N/A'):
+                continue
+            packets.append((float(fields[0]), 'K' in fields[1]))
+
+        # packets come in decode order, frames are shown in timestamp order
+        pts = sorted([sec for sec, _ in packets])
+        start = pts[0] if len(pts) > 0 else 0
+        pts = [round(sec - start, 6) for sec in pts]
+
+        keyframes = sorted(set([bisect.bisect_left(pts, round(sec - start, 6)) for sec, key in packets if key]))
+        return pts, keyframes
+
+    @staticmethod
+    def __scan(path: str) -> tuple[list[float], Optional[list[int]]]:
+        video = cv2.VideoCapture(path)
+        if not video.isOpened():
+            raise ValueError(f"Cannot open video file: {path}")
+
+        # opencv does not expose keyframes, grab without color conversion for the timestamps
+        pts = []
+        while video.grab():
+            pts.append(video.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+        video.release()
+
+        return pts, None
+
+# frames decoded forward instead of seeking when the keyframes are unknown
+FORWARD_LIMIT = 30
+
+class IndexedReader:
+    def __init__(self, video: cv2.VideoCapture, index: FrameIndex):
+        self.video = video
+        self.index = index
+        # next frame the decoder returns
+        self.position = None
+        # frame last returned, by its decoded timestamp
+        self.decoded = None
+
+    def read(self, idx: int) -> Optional[cv2.Mat]:
+        if self.position is None or idx < self.position or self.__seek_closer(idx):
+            landed = self.__seek(idx)
+            if landed is None:
+                return None
+
+            # the seek landed on the frame, or past it with nothing earlier to start from
+            if landed >= idx:
+                ret, frame = self.video.retrieve()
+                return frame if ret else None
+
+        # grab skips the color conversion of the frames in between
+        while self.position < idx:
+            if not self.video.grab():
+                self.position = None
+                return None
+            self.position += 1
+
+        return self.read_next()
+
+    def read_next(self) -> Optional[cv2.Mat]:
+        ret, frame = self.video.read()
+        if not ret:
+            self.position = None
+            return None
+
+        self.decoded = self.__landed()
+        self.position = self.decoded + 1
+        return frame
+
+    def __seek(self, idx: int) -> Optional[int]:
+        # straight to the keyframe before the frame by its timestamp, frame numbers are only
+        # exact on constant frame rate footage without edit lists
+        start = self.index.keyframe(idx)
+        if start is None:
+            start = idx
+
+        while True:
+            self.video.set(cv2.CAP_PROP_POS_MSEC, self.index.pts[start] * 1000)
+            if not self.video.grab():
+                self.position = None
+                return None
+
+            # the decoder tells where it really is, step back a keyframe when it overshot
+            landed = self.__landed()
+            if landed <= idx or start == 0:
+                break
+
+            previous = self.index.keyframe(start - 1)
+            if previous is None:
+                previous = start - FORWARD_LIMIT
+            start = max(0, previous if previous < start else 0)
+
+        self.decoded = landed
+        self.position = landed + 1
+        return landed
+
+    def __landed(self) -> int:
+        return self.index.nearest(self.video.get(cv2.CAP_PROP_POS_MSEC) / 1000)
+
+    def __seek_closer(self, idx: int) -> bool:
+        keyframe = self.index.keyframe(idx)
+        if keyframe is None:
+            return idx - self.position > FORWARD_LIMIT
+
+        # a keyframe past the position decodes less than continuing from here
+        return keyframe > self.position
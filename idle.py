@@ -0,0 +1,78 @@
+from typing import Callable, Iterator, Optional, Tuple
+import cv2
+
+PROBE_WIDTH = 160
+BRIGHT_THRESHOLD = 150
+MIN_BRIGHT_PIXELS = 4
+
+def is_lit(image: cv2.Mat) -> bool:
+    # a few bright pixels on a heavily downscaled gray frame means the panel leds are on
+    height, width = image.shape[:2]
+    probe_height = max(1, int(height * PROBE_WIDTH / width))
+
+    small = cv2.resize(image, (PROBE_WIDTH, probe_height), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    return cv2.countNonZero(cv2.inRange(gray, BRIGHT_THRESHOLD, 255)) >= MIN_BRIGHT_PIXELS
+
+def first_lit(read: Callable[[float], Optional[cv2.Mat]], idle_sec: float, end_sec: float, interval: float) -> Tuple[float, Optional[cv2.Mat]]:
+    # step through the samples between an idle one and the end
+    cur_sec = idle_sec + interval
+    while cur_sec < end_sec:
+        frame = read(cur_sec)
+        if frame is None:
+            break
+
+        if is_lit(frame):
+            return cur_sec, frame
+        cur_sec += interval
+
+    return cur_sec, None
+
+def active_frames(read: Callable[[float], Optional[cv2.Mat]], start: float, interval: float, jump: float) -> Iterator[Tuple[float, cv2.Mat]]:
+    # jumps stay on the interval grid so the samples match a run without idle skipping
+    jump = max(1, int(jump // interval)) * interval
+
+    cur_sec = start
+    while True:
+        frame = read(cur_sec)
+        if frame is None:
+            return
+
+        if is_lit(frame):
+            yield cur_sec, frame
+            cur_sec += interval
+            continue
+
+        # idle, jump ahead until the panel is lit again
+        idle_sec = cur_sec
+        while True:
+            lit_sec = idle_sec + jump
+            lit_frame = read(lit_sec)
+            if lit_frame is None:
+                # past the end, the footage before it can still light up
+                lit_sec, lit_frame = first_lit(read, idle_sec, lit_sec, interval)
+                if lit_frame is None:
+                    return
+
+                idle_sec = lit_sec - interval
+                break
+
+            if is_lit(lit_frame):
+                break
+
+            idle_sec = lit_sec
+
+        # binary search for the first lit sample after the idle stretch
+        while lit_sec - idle_sec > interval:
+            mid_sec = idle_sec + ((lit_sec - idle_sec) // interval // 2) * interval
+            mid_frame = read(mid_sec)
+            if mid_frame is not None and is_lit(mid_frame):
+                lit_sec, lit_frame = mid_sec, mid_frame
+            else:
+                idle_sec = mid_sec
+
+        print(f'skipped idle footage {cur_sec} - {idle_sec} sec')
+
+        yield lit_sec, lit_frame
+        cur_sec = lit_sec + interval
@@ -0,0 +1,125 @@
+from typing import Optional
+
+from utils import Rect
+
+# digits of the widest reading, seven segment numbers are right aligned and grow to the left
+FULL_DIGITS = {'TEMPERATURE': 3, 'POWER': 3, 'FAN': 3}
+# seven segment digit pitch in digit heights, on the generous side
+DIGIT_PITCH = 0.7
+
+def full_width(name: str, rect: Rect) -> Rect:
+    # a box fitted on 95 still has to read 105, widen it to the left like the detector margin
+    digits = FULL_DIGITS.get(name)
+    if digits is None:
+        return rect
+
+    need = int(digits * DIGIT_PITCH * rect.h) + 10
+    if rect.w >= need:
+        return rect
+
+    x = max(0, rect.x2() - need)
+    return Rect([x, rect.y, rect.x2() - x, rect.h])
+
+class PanelLayout:
+    def __init__(self, redetect: int = 0, min_score: float = 0.6):
+        self.redetect = redetect
+        self.min_score = min_score
+
+        self.__rects: dict[str, Rect] = {}
+        self.__pinned: dict[str, Rect] = {}
+        self.__pinned_fit = None
+        # rotation and frame size the boxes were fitted at
+        self.__rotation = None
+        self.__size = None
+        self.__frames = 0
+
+    def valid(self) -> bool:
+        if not 'POWER' in self.__rects:
+            return False
+
+        # force a full detection every n cached frames
+        if self.redetect > 0 and self.__frames >= self.redetect:
+            return False
+
+        return True
+
+    def pinned(self) -> bool:
+        return len(self.__pinned) > 0
+
+    def rotation(self) -> Optional[int]:
+        return self.__rotation if self.valid() else None
+
+    def matches(self, rotation: int, width: int, height: int) -> bool:
+        # boxes of another rotation are not wrong, only not for this attempt
+        return self.__rotation == rotation and self.__size == (width, height)
+
+    def validate(self, width: int, height: int) -> bool:
+        if self.__size is not None and self.__size != (width, height):
+            return False
+
+        for rect in self.__rects.values():
+            if rect.x < 0 or rect.y < 0 or \
+                rect.w <= 0 or rect.h <= 0 or \
+                rect.x2() > width or rect.y2() > height:
+                return False
+
+        return True
+
+    def rects(self) -> dict[str, Rect]:
+        return {name: Rect(rect.to_list()) for name, rect in self.__rects.items()}
+
+    def pin(self, rects: dict[str, Rect], width: int, height: int, rotation: int = 0):
+        # calibrated boxes survive a reset, only the frame falls back to detection
+        self.__pinned = {name: full_width(name, rect) for name, rect in rects.items()}
+        self.__pinned_fit = (rotation, (width, height))
+        self.reset()
+
+    def update(self, rects: dict[str, Rect], rotation: int, width: int, height: int):
+        # boxes from another rotation or frame size start over
+        if self.__rotation != rotation or self.__size != (width, height):
+            self.__rects = {}
+        self.__rotation = rotation
+        self.__size = (width, height)
+
+        # keep boxes from earlier good frames, the mode indicators are not lit at the same time
+        for name, rect in rects.items():
+            self.__rects[name] = full_width(name, Rect([max(0, rect.x), max(0, rect.y), rect.w, rect.h]))
+
+        self.__frames = 0
+
+    def hit(self):
+        self.__frames += 1
+
+    def reset(self):
+        self.__rects = {name: Rect(rect.to_list()) for name, rect in self.__pinned.items()}
+        self.__rotation, self.__size = self.__pinned_fit if self.__pinned_fit is not None else (None, None)
+        self.__frames = 0
+
+class PanelTracker:
+    def __init__(self, count: int):
+        self.count = count
+        # horizontal center of every panel as last seen
+        self.__centers: list[Optional[float]] = [None] * count
+
+    def assign(self, centers: list[float]) -> list[int]:
+        # panel index of every cluster, the nearest panel seen before keeps its index
+        # so a missing panel does not shift the others
+        indices: list[Optional[int]] = [None] * len(centers)
+        pairs = sorted([(abs(center - known), idx, panel) for idx, center in enumerate(centers)
+                        for panel, known in enumerate(self.__centers) if known is not None])
+
+        used = set()
+        for _, idx, panel in pairs:
+            if indices[idx] is None and not panel in used:
+                indices[idx] = panel
+                used.add(panel)
+
+        # new panels take the free indices left to right
+        free = [panel for panel in range(self.count) if not panel in used]
+        for idx in sorted([idx for idx in range(len(centers)) if indices[idx] is None], key=lambda idx: centers[idx]):
+            indices[idx] = free.pop(0)
+
+        for idx, panel in enumerate(indices):
+            self.__centers[panel] = centers[idx]
+
+        return indices
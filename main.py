@@ -1,36 +1,65 @@
+import itertools
+import multiprocessing
 import os
 import shutil
 import time
-from typing import List, Optional
+from typing import Callable, Iterable, List, Optional, Tuple
 import cv2
 import argparse
 import re
 import csv
+import numpy as np
 
+from adaptive import refine
+from checkpoint import Checkpoint
 from context import Context, FrameContext, Settings, Options
+from frameindex import FrameIndex, IndexedReader
+from idle import active_frames, is_lit
 from ocr import OCR
+from ocrcache import OCRCache
+from profiler import FrameProfiler
+from publish import new_publisher
+from quality import best_frame, layout_roi
+from rawvideo import RawVideo, has_ffmpeg
+from resources import ResourceManager
+from roicache import CachedFrame, ROICacheReader
+from sequence import ImageSequence, is_sequence
 from skywalker import SkyWalker, Result
 from training import RecognitionTraining
+from utils import Rect, rotate_image, unrotate_rect
 
 class Result2:
-    def __init__(self, res: Result, elapsed: int):
+    def __init__(self, res: Result, elapsed: int, sec: float = 0, time: Optional[float] = None):
         self.result = res
         self.elapsed = elapsed
+        # sampled second, the key for checkpoints and adaptive sampling
+        self.sec = sec
+        # presentation time of the frame that was read
+        self.time = time if time is not None else sec
 
-def write_result(ctx: Context, results: list[Result2]):
+def write_result(ctx: Context, results: list[Result2], append: bool = False):
     if len(results) == 0:
         return
 
-    outFile = os.path.join(ctx.settings.output_path, 'results.csv')
-    with open(outFile, 'w') as f:
-        wrt = csv.writer(f, delimiter=',')
-        wrt.writerow(['name', 'time', 'temperature','profile', 'power',' fan', 'mode', 'elapsed (msec)'])
+    # one results stream per panel
+    panels: dict[int, list[Result2]] = {}
+    for res in results:
+        panels.setdefault(res.result.panel, []).append(res)
 
-        for res in results:
-            wrt.writerow([res.result.name, res.result.time, res.result.temperature, res.result.profile, res.result.power, res.result.fan, res.result.mode, res.elapsed])
+    for panel, panel_results in panels.items():
+        filename = 'results.csv' if ctx.options.panels <= 1 else f'results_panel{panel}.csv'
+        outFile = os.path.join(ctx.settings.output_path, filename)
+        header = not append or not os.path.isfile(outFile) or os.path.getsize(outFile) == 0
+        with open(outFile, 'a' if append else 'w') as f:
+            wrt = csv.writer(f, delimiter=',')
+            if header:
+                wrt.writerow(['name', 'time', 'temperature','profile', 'power',' fan', 'mode', 'elapsed (msec)', 'frame time (sec)'])
 
+            for res in panel_results:
+                wrt.writerow([res.result.name, res.result.time, res.result.temperature, res.result.profile, res.result.power, res.result.fan, res.result.mode, res.elapsed, res.time])
 
-def process_image(ctx: FrameContext) -> Optional[Result]:
+
+def get_degrees(ctx: FrameContext) -> List[int]:
     degrees: List[int] = [0]
     options: Options = ctx.options
 
@@ -39,98 +68,572 @@ def process_image(ctx: FrameContext) -> Optional[Result]:
             degrees = [int(options.rotate)]
         elif options.rotate == 'auto':
             degrees = [0, 90, 180, 270]
+
+    # try the rotation of the cached layout first, then the calibrated one
+    first = [ctx.calibration.rotate] if ctx.calibration is not None else []
+    rotation = ctx.layout.rotation() if ctx.layout is not None else None
+    if rotation is not None:
+        first = [rotation] + [d for d in first if d != rotation]
+
+    degrees = first + [d for d in degrees if not d in first]
+
+    return degrees
+
+def quality_roi(ctx: Context, frame: cv2.Mat) -> Optional[Rect]:
+    # the layout boxes are on the frame rotated like the layout was fitted, scored on the frame as read
+    rotation = ctx.layout.rotation()
+    if rotation is None:
+        return None
+
+    height, width = frame.shape[:2]
+    rotated = (height, width) if rotation in (90, 270) else (width, height)
+    if not ctx.layout.matches(rotation, rotated[0], rotated[1]):
+        return None
+
+    roi = layout_roi(ctx.layout.rects(), rotated[0], rotated[1])
+    return unrotate_rect(roi, rotation, width, height) if roi is not None else None
+
+def process_image(ctx: FrameContext) -> Optional[Result]:
+    frame = ctx.image
         
-    for degree in degrees:
-        image = ctx.image
-        if degree == 90:
-            image = cv2.transpose(image, degree)
-            image = cv2.flip(image, 1)
-        elif degree == 180:
-            image = cv2.flip(image, -1)
-        elif degree == 270:
-            image = cv2.transpose(image, degree)
-            image = cv2.flip(image, 0)
+    for degree in get_degrees(ctx):
+        ctx.image = rotate_image(frame, degree)
+        ctx.rotation = degree
 
+        skywalker = SkyWalker(ctx)
         if ctx.options.panel:
-            res = SkyWalker(ctx).detect_panel()
+            res = skywalker.detect_panel()
         else:
-            res = SkyWalker(ctx).detect()
+            res = skywalker.detect()
+
+        # one composited debug image per rotation attempt
+        ctx._render_overlay()
 
         if res is not None:
+            if ctx.roi_cache is not None:
+                height, width = ctx.image.shape[:2]
+                ctx.roi_cache.write(ctx.name, ctx.sec, width, height, list(skywalker.displays.values()))
+
             return res
             
     return None
 
-def process_video(ctx: Context):
+def replay_frame(ctx: FrameContext, frame: CachedFrame) -> list[Result]:
+    res = SkyWalker(ctx).replay(frame)
+    ctx._render_overlay()
+    return [res] if res is not None else []
+
+def process_frame(ctx: FrameContext) -> list[Result]:
+    if ctx.options.panels <= 1:
+        res = process_image(ctx)
+        return [res] if res is not None else []
+
+    frame = ctx.image
+
+    for degree in get_degrees(ctx):
+        ctx.image = rotate_image(frame, degree)
+        ctx.rotation = degree
+
+        results = SkyWalker(ctx).detect_panels(ctx.options.panels)
+        ctx._render_overlay()
+        if len(results) > 0:
+            return results
+
+    return []
+
+def process_frames(ctx: Context, frames: Iterable[Tuple[float, float, cv2.Mat, Callable[[FrameContext], list[Result]]]], count: int) -> list[Result2]:
     settings: Settings = ctx.settings
     options: Options = ctx.options
 
-    video = cv2.VideoCapture(settings.input_path)
-    if not video.isOpened():
-        raise ValueError(f"Cannot open video file: {settings.input_path}")
-    
-    cur_sec = options.skip
-    num_frames = options.count
+    num_frames = count
 
-    results: list[Result] = []
+    profiler = None
+    if options.profile > 0 or options.profile_threshold > 0:
+        profiler = FrameProfiler(settings.output_path, options.profile, options.profile_threshold)
 
-    while True:
-        video.set(cv2.CAP_PROP_POS_MSEC, cur_sec * 1000)
-        ret, frame = video.read()
+    results: list[Result2] = []
+    index = 0
+
+    for cur_sec, frame_time, frame, fn in frames:
+        name = f"frame_{cur_sec}"
+        sampled = profiler is not None and profiler.sampled(index)
+
+        fctx = ctx.new_frame_context(name, frame, cur_sec, frame_time)
 
-        if not ret:
-            break
-        
         t1 = time.time()
-        line = process_image(ctx.new_frame_context(f"frame_{cur_sec}", frame))
+        if sampled:
+            lines = profiler.run(name, fn, fctx)
+        elif profiler is not None and profiler.threshold > 0:
+            # slow frames are only known afterwards, profile every frame and keep the slow ones
+            lines = profiler.run(f'{name}_slow', fn, fctx, keep=profiler.slow, memory=False)
+        else:
+            lines = fn(fctx)
 
         elapsed = int((time.time() - t1) * 1000)
         
-        if line is not None:
-            results.append(Result2(line, elapsed))
+        # every sampled frame, also the ones without a reading
+        ctx.frame_times.append(elapsed)
+
+        frame_results = [Result2(line, elapsed, cur_sec, frame_time) for line in lines]
+        results.extend(frame_results)
+
+        if ctx.publisher is not None:
+            for res in frame_results:
+                ctx.publisher.publish(res.result, res.elapsed, res.time)
 
-        if options.count > 0:
+        if ctx.checkpoint is not None:
+            ctx.checkpoint.add(cur_sec, frame_results)
+
+        # display not found, power missing or a failed conversion
+        if ctx.debug_ring is not None:
+            ctx.debug_ring.commit(fctx, len(lines) == 0 or len(fctx.failures) > 0)
+
+        if count > 0:
             num_frames = num_frames - 1
             if num_frames == 0:
                 break
 
-        cur_sec += options.interval
+        index += 1
+
+    if profiler is not None:
+        profiler.close()
+
+    return results
+
+def process_video(ctx: Context, secs: Optional[list[int]] = None) -> list[Result2]:
+    settings: Settings = ctx.settings
+    options: Options = ctx.options
+
+    video = cv2.VideoCapture(settings.input_path)
+    if not video.isOpened():
+        raise ValueError(f"Cannot open video file: {settings.input_path}")
+    
+    last_sec = None
+
+    index = FrameIndex.load(settings.input_path) if options.frame_index else None
+    reader = IndexedReader(video, index) if index is not None else None
+
+    def read(sec: float) -> Optional[cv2.Mat]:
+        nonlocal last_sec
+        last_sec = sec
+
+        if reader is not None:
+            idx = index.find(sec)
+            if idx is None:
+                return None
+
+            return reader.read(idx)
+
+        video.set(cv2.CAP_PROP_POS_MSEC, sec * 1000)
+        ret, frame = video.read()
+
+        return frame if ret else None
+
+    def read_next() -> Optional[cv2.Mat]:
+        if reader is not None:
+            return reader.read_next()
+
+        ret, frame = video.read()
+        return frame if ret else None
+
+    def frame_time() -> float:
+        # where the decoder is after decoding, a seek can land off the sample on variable frame rate footage
+        if reader is not None and reader.decoded is not None:
+            return index.timestamp(reader.decoded)
+
+        return round(video.get(cv2.CAP_PROP_POS_MSEC) / 1000, 3)
+
+    def select(sec: float, frame: cv2.Mat) -> Tuple[Optional[cv2.Mat], float]:
+        # the idle search may have read other frames since
+        if last_sec != sec:
+            frame = read(sec)
+            if frame is None:
+                return None, sec
+
+        candidates = [(frame, frame_time())]
+        if options.quality_window <= 1 and options.min_sharpness <= 0:
+            return candidates[0]
+
+        if options.quality_window > 1:
+            # the rest of the window is decoded sequentially after the sample, without seeking
+            for _ in range(options.quality_window - 1):
+                next_frame = read_next()
+                if next_frame is None:
+                    break
+                candidates.append((next_frame, frame_time()))
+
+        best = best_frame([candidate for candidate, _ in candidates], options.min_sharpness, quality_roi(ctx, frame))
+        if best is None:
+            print(f'rejected unreadable frame at {sec} sec')
+            return None, sec
+
+        return [(candidate, candidate_sec) for candidate, candidate_sec in candidates if candidate is best][0]
+
+    def read_frames():
+        for cur_sec in secs:
+            frame = read(cur_sec)
+
+            if frame is None:
+                break
+
+            # fixed timestamps cannot jump, only drop the idle frames
+            if options.idle_skip > 0 and not is_lit(frame):
+                continue
+
+            frame, frame_sec = select(cur_sec, frame)
+            if frame is None:
+                continue
+
+            yield cur_sec, frame_sec, frame, process_frame
+
+    def read_active_frames():
+        for cur_sec, frame in active_frames(read, options.skip, options.interval, options.idle_skip):
+            frame, frame_sec = select(cur_sec, frame)
+            if frame is None:
+                continue
+
+            yield cur_sec, frame_sec, frame, process_frame
+
+    # explicit timestamps are already limited to the frame count
+    count = options.count if secs is None else 0
+
+    if secs is None and options.idle_skip > 0:
+        frames = read_active_frames()
+    else:
+        if secs is None:
+            secs = itertools.count(options.skip, options.interval)
+        frames = read_frames()
+
+    results = process_frames(ctx, frames, count)
+
+    video.release()
+
+    return results
+
+def process_rawvideo(ctx: Context, secs: Optional[list[int]] = None) -> list[Result2]:
+    options: Options = ctx.options
+
+    crop = Rect([int(v) for v in options.crop.split(',')]) if options.crop else None
+    video = RawVideo(ctx.settings.input_path, crop, options.scale_width)
+
+    start = options.skip if secs is None else secs[0]
+    end = None if secs is None else secs[-1]
+
+    def read_frames():
+        # ffmpeg selects, crops and scales, the frames arrive ready to detect
+        for cur_sec, frame in video.frames(start, options.interval):
+            if end is not None and cur_sec > end:
+                break
+
+            # the stream cannot jump, only drop the idle frames
+            if options.idle_skip > 0 and not is_lit(frame):
+                continue
+
+            if options.min_sharpness > 0 and best_frame([frame], options.min_sharpness, quality_roi(ctx, frame)) is None:
+                print(f'rejected unreadable frame at {cur_sec} sec')
+                continue
+
+            yield cur_sec, cur_sec, frame, process_frame
+
+    return process_frames(ctx, read_frames(), options.count if secs is None else 0)
+
+def is_uniform(secs: list[int], interval: int) -> bool:
+    return all([b - a == interval for a, b in zip(secs, secs[1:])])
+
+def process_sequence(ctx: Context, secs: Optional[list[float]] = None) -> list[Result2]:
+    options: Options = ctx.options
+
+    sequence = new_sequence(ctx)
+    if secs is None:
+        secs = sequence.sample(options.skip, options.interval)
+        count = options.count
+    else:
+        # explicit timestamps are already limited to the frame count
+        count = 0
+
+    def read_frames():
+        for cur_sec, frame in sequence.frames(secs):
+            if frame is None:
+                print(f'cannot read image at {cur_sec} sec')
+                continue
+
+            if options.idle_skip > 0 and not is_lit(frame):
+                continue
+
+            if options.min_sharpness > 0 and best_frame([frame], options.min_sharpness, quality_roi(ctx, frame)) is None:
+                print(f'rejected unreadable image at {cur_sec} sec')
+                continue
+
+            yield cur_sec, cur_sec, frame, process_frame
+
+    return process_frames(ctx, read_frames(), count)
+
+def process_input(ctx: Context, secs: Optional[list[float]] = None) -> list[Result2]:
+    if is_sequence(ctx.settings.input_path):
+        return process_sequence(ctx, secs)
+
+    # the ffmpeg stream only yields frames on the interval grid
+    if ctx.options.ffmpeg and (secs is None or is_uniform(secs, ctx.options.interval)):
+        return process_rawvideo(ctx, secs)
+
+    return process_video(ctx, secs)
+
+def new_sequence(ctx: Context) -> ImageSequence:
+    # listed once per process, exif order opens every image
+    if ctx.sequence is None:
+        ctx.sequence = ImageSequence(ctx.settings.input_path, ctx.options.image_order, 
+                                     max(1, min(4, ctx.options.prefetch)), max(1, ctx.options.prefetch), ctx.options.interval)
 
+    return ctx.sequence
+
+def replay_video(ctx: Context) -> list[Result2]:
+    # recognition only, the display crops come from the mapped roi cache
+    reader = ROICacheReader(ctx.settings.input_path)
+
+    def read_frames():
+        for sec in reader.timestamps():
+            if sec < ctx.options.skip:
+                continue
+
+            frame = reader.read(sec)
+            image = None
+            # the overlay of the captured debug steps is drawn on it too
+            if ctx.options.debug or ctx.options.debug_ring > 0:
+                image = np.zeros((frame.height, frame.width, 3), dtype=np.uint8)
+
+            yield sec, sec, image, lambda fctx, frame=frame: replay_frame(fctx, frame)
+
+    results = process_frames(ctx, read_frames(), ctx.options.count)
+
+    reader.close()
+
+    return results
+
+def get_timestamps(ctx: Context) -> list[float]:
+    if is_sequence(ctx.settings.input_path):
+        return new_sequence(ctx).sample(ctx.options.skip, ctx.options.interval, ctx.options.count)
+
+    video = cv2.VideoCapture(ctx.settings.input_path)
+    if not video.isOpened():
+        raise ValueError(f"Cannot open video file: {ctx.settings.input_path}")
+
+    fps = video.get(cv2.CAP_PROP_FPS)
+    duration = video.get(cv2.CAP_PROP_FRAME_COUNT) / fps if fps > 0 else 0
     video.release()
 
-    write_result(ctx, results)
+    secs = list(range(ctx.options.skip, int(duration) + 1, ctx.options.interval))
+    if ctx.options.count > 0:
+        secs = secs[:ctx.options.count]
+
+    return secs
+
+# frames per worker chunk when no checkpoint interval is set
+CHUNK_FRAMES = 50
+
+worker_context: Context = None
+worker_cache: OCRCache = None
+
+def init_worker(args: argparse.Namespace, cores: multiprocessing.Queue):
+    global worker_context, worker_cache
+
+    threads = ResourceManager.configure(cores.get(), args.pin)
+    OCR(threads, args.ocr_pool)
+    if args.ocr_cache:
+        worker_cache = OCRCache(args.ocr_cache, args.ocr_cache_size)
+        OCR.use_cache(worker_cache)
+    worker_context = Context(args)
+
+def process_chunk(secs: list[float]) -> Tuple[list[Result2], list[int], Tuple[int, int]]:
+    worker_context.frame_times = []
+    hits, misses = (worker_cache.hits, worker_cache.misses) if worker_cache is not None else (0, 0)
+
+    results = process_input(worker_context, secs)
+
+    # the pool terminates the workers without closing anything, keep the cache current per chunk
+    cache_counts = (0, 0)
+    if worker_cache is not None:
+        worker_cache.flush()
+        cache_counts = (worker_cache.hits - hits, worker_cache.misses - misses)
 
-    if ctx.options.training:
-        RecognitionTraining().close()
+    return results, worker_context.frame_times, cache_counts
+
+def process_parallel(ctx: Context, args: argparse.Namespace, resources: ResourceManager) -> list[Result2]:
+    # small contiguous chunks, results arrive and get checkpointed while the workers are busy
+    secs = get_timestamps(ctx)
+    size = args.checkpoint if args.checkpoint > 0 else CHUNK_FRAMES
+    size = max(1, min(size, -(-len(secs) // resources.workers)))
+    chunks = [secs[idx:idx + size] for idx in range(0, len(secs), size)]
+
+    mp = multiprocessing.get_context('spawn')
+    cores = mp.Queue()
+    for allocated in resources.allocate():
+        cores.put(allocated)
+
+    resources.configure_env()
+    results: list[Result2] = []
+    with mp.Pool(resources.workers, initializer=init_worker, initargs=(args, cores)) as pool:
+        # chunks are published as each worker finishes, in order so the checkpoint stays contiguous
+        for secs, (chunk, frame_times, cache_counts) in zip(chunks, pool.imap(process_chunk, chunks)):
+            results.extend(chunk)
+            ctx.frame_times.extend(frame_times)
+            ctx.cache_hits += cache_counts[0]
+            ctx.cache_misses += cache_counts[1]
+
+            if ctx.publisher is not None:
+                for res in chunk:
+                    ctx.publisher.publish(res.result, res.elapsed, res.time)
+
+            if ctx.checkpoint is not None:
+                ctx.checkpoint.add(secs[-1], chunk, len(secs))
+
+    return results
+
+def next_sample(input_path: str, last_sec: float, skip: int, interval: int) -> float:
+    # sequences sample an interval after the last image
+    if is_sequence(input_path):
+        return last_sec + interval
+
+    # videos sample on the seconds grid from the first skip, the frame time can be a little off it
+    return skip + (int((last_sec - skip + 0.001) // interval) + 1) * interval
 
 def main(args):
+    run_pipeline(args)
+
+def run_pipeline(args) -> Optional[Tuple[Context, list[Result2]]]:
     input_path = args.input_path
     output_path = args.output_path
 
-    if not os.path.exists(input_path):
+    if not os.path.exists(input_path) and not is_sequence(input_path):
         print(f"Input path does not exist: {input_path}")
-        return
+        return None
 
-    shutil.rmtree(output_path, ignore_errors=True)
-    os.makedirs(output_path, exist_ok=True)
+    checkpoint = None
+    if args.resume:
+        checkpoint = Checkpoint.load(output_path)
+        if checkpoint is None:
+            # nothing to resume, the earlier output is kept
+            print(f"no checkpoint to resume from: {output_path}")
+            return None
 
-    if not os.path.isfile(input_path):
+    if checkpoint is not None:
+        # continue after the last checkpointed frame
+        args.skip = next_sample(input_path, checkpoint['last_sec'], args.skip, args.interval)
+        if args.count > 0:
+            args.count = args.count - checkpoint['frames']
+            if args.count <= 0:
+                print(f"all frames already processed: {output_path}")
+                return None
+
+        print(f"resuming from {args.skip} sec, {checkpoint['frames']} frames processed")
+    else:
+        shutil.rmtree(output_path, ignore_errors=True)
+        os.makedirs(output_path, exist_ok=True)
+
+    if not os.path.isfile(input_path) and not is_sequence(input_path):
         print(f"input file not found: {input_path}")
-        return
+        return None
+
+    if args.ffmpeg and (not has_ffmpeg() or is_sequence(input_path) or args.replay):
+        print('ffmpeg frame source is not available for this input, using opencv')
+        args.ffmpeg = False
+
+    if args.quality_window > 1 and (args.ffmpeg or is_sequence(input_path)):
+        # only a decoded video can read the frames after a sample
+        print('quality window is not supported for image sequences and the ffmpeg frame source, ignored')
+
+    if args.frame_index and not (is_sequence(input_path) or args.replay):
+        # built once before the workers start, later runs load it
+        FrameIndex.ensure(input_path)
+
+    if args.replay and is_sequence(input_path):
+        print(f"replay needs a roi cache file: {input_path}")
+        return None
+
+    if args.roi_cache and args.panels > 1:
+        # the cache holds one panel per frame
+        print('roi cache is not supported with several panels, disabled')
+        args.roi_cache = ''
+
+    resources = ResourceManager(args.workers, args.pin)
+    if resources.workers > 1 and (args.training or args.roi_cache or args.replay or args.adaptive > 0):
+        print('training output, roi cache and adaptive sampling are not supported with workers, using a single worker')
+        resources = ResourceManager(1, args.pin)
 
-    # initialize paddle to isolate timing
-    s = OCR()
+    if args.adaptive > 0 and (args.checkpoint > 0 or args.resume or args.replay):
+        print('adaptive sampling is not supported with checkpoints or replay, disabled')
+        args.adaptive = 0
 
     context = Context(args)
 
-    if args.training:
-        RecognitionTraining(args.output_path)
+    if args.publish:
+        context.publisher = new_publisher(args.publish)
 
-    process_video(context)
+    ocr_cache = None
+    if args.ocr_cache:
+        ocr_cache = OCRCache(args.ocr_cache, args.ocr_cache_size)
+        OCR.use_cache(ocr_cache)
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Process images from input path and save to output path.")
-    parser.add_argument('input_path', type=str, help="Path to the input images directory or video file.")
+    if args.checkpoint > 0 or checkpoint is not None:
+        last_sec, frames = (checkpoint['last_sec'], checkpoint['frames']) if checkpoint is not None else (None, 0)
+        context.checkpoint = Checkpoint(output_path, args.checkpoint if args.checkpoint > 0 else 10, 
+                                        lambda results: write_result(context, results, True), last_sec, frames)
+
+    if resources.workers > 1:
+        resources.start()
+        results = process_parallel(context, args, resources)
+    else:
+        threads = ResourceManager.configure(resources.allocate()[0], args.pin)
+
+        # initialize paddle to isolate timing
+        s = OCR(threads, args.ocr_pool)
+
+        if args.training:
+            RecognitionTraining(args.output_path)
+
+        resources.start()
+        if args.replay:
+            results = replay_video(context)
+        else:
+            results = process_input(context)
+
+            if args.adaptive > 0:
+                results = refine(lambda secs: process_input(context, secs), results, args.adaptive, args.adaptive_temp)
+
+        if args.training:
+            RecognitionTraining().close()
+
+        if context.roi_cache is not None:
+            context.roi_cache.close()
+
+    resources.report()
+
+    if context.tiles is not None and context.tiles.frames > 0:
+        print(f'incremental preprocessing: {context.tiles.full} of {context.tiles.frames} frames fully processed, ' + 
+              f'{context.tiles.regions} changed regions')
+
+    if context.predictor is not None:
+        print(f'recognized {context.predictor.recognized} displays, predicted {context.predictor.predicted}')
+
+    if ocr_cache is not None:
+        OCR.use_cache(None)
+        ocr_cache.close()
+        print(f'ocr cache hits {ocr_cache.hits + context.cache_hits}, misses {ocr_cache.misses + context.cache_misses}')
+
+    if context.publisher is not None:
+        context.publisher.close()
+        print(f'published {context.publisher.sent} results, dropped {context.publisher.dropped}')
+
+    if context.checkpoint is not None:
+        # results were appended as they were checkpointed
+        context.checkpoint.flush()
+    else:
+        write_result(context, results)
+
+    return context, results
+
+def new_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('input_path', type=str, help="Path to the input images directory, image glob or video file.")
     parser.add_argument('output_path', type=str, help="Path to the output (and debug) directory.")
     parser.add_argument('--skip', type=int, default=0, required=False, help="Skip number of seconds.")
     parser.add_argument('--count', type=int, default=0, required=False, help="Number of frames to process.")
@@ -138,6 +641,40 @@ if __name__ == "__main__":
     parser.add_argument('--rotate', type=str, default='auto', required=False, help="Rotation (auto|<degree>).")
     parser.add_argument('--debug', type=bool, default=False, required=False, help="Write debug image")
     parser.add_argument('--panel', type=bool, default=False, required=False, help="Uses paddle to detect panel")
+    parser.add_argument('--panels', type=int, default=1, required=False, help="Number of roaster panels in the frame")
+    parser.add_argument('--redetect', type=int, default=0, required=False, help="Force full panel detection every n frames (0 = only when cached layout fails)")
+    parser.add_argument('--calibration', type=str, default='', required=False, help="Rig calibration profile (from calibrate.py)")
+    parser.add_argument('--profile', type=int, default=0, required=False, help="Profile every n-th frame (cProfile, tracemalloc, folded stacks)")
+    parser.add_argument('--profile-threshold', type=int, default=0, required=False, help="Profile frames slower than n msec (every frame runs under cProfile, only slow ones are kept)")
+    parser.add_argument('--ocr-pool', type=int, default=1, required=False, help="Paddle instances shared by the recognition threads of a worker")
+    parser.add_argument('--workers', type=int, default=1, required=False, help="Number of worker processes, cores are split between them")
+    parser.add_argument('--pin', type=bool, default=False, required=False, help="Pin workers to their cores")
+    parser.add_argument('--publish', type=str, default='', required=False, help="Publish results as ndjson (stdout|unix:<path>|tcp:<host>:<port>|udp:<host>:<port>)")
+    parser.add_argument('--roi-cache', type=str, default='', required=False, help="Save the display crops of every frame to a roi cache file")
+    parser.add_argument('--replay', type=bool, default=False, required=False, help="Input is a roi cache file, run recognition only")
+    parser.add_argument('--checkpoint', type=int, default=0, required=False, help="Checkpoint results every n frames")
+    parser.add_argument('--resume', type=bool, default=False, required=False, help="Resume from the checkpoint in the output path")
+    parser.add_argument('--idle-skip', type=int, default=0, required=False, help="Jump n seconds over idle (panel off) footage")
+    parser.add_argument('--adaptive', type=float, default=0, required=False, help="Bisect around mode, power, fan and profile changes to n seconds")
+    parser.add_argument('--adaptive-temp', type=float, default=2.0, required=False, help="Also bisect when temperature changes faster than n degree / second")
+    parser.add_argument('--predict', type=bool, default=False, required=False, help="Predict slow changing displays and recognize them at their own rate")
+    parser.add_argument('--ocr-cache', type=str, default='', required=False, help="Persistent ocr result cache (sqlite) shared across runs")
+    parser.add_argument('--ocr-cache-size', type=int, default=100000, required=False, help="Maximum ocr cache entries, least recently used are evicted")
+    parser.add_argument('--debug-ring', type=int, default=0, required=False, help="Keep the debug images of the last n frames in memory, written when a frame fails")
+    parser.add_argument('--image-order', type=str, default='name', required=False, help="Image sequence order and timestamps (name|mtime|exif)")
+    parser.add_argument('--prefetch', type=int, default=8, required=False, help="Images decoded ahead of processing")
+    parser.add_argument('--ffmpeg', type=bool, default=False, required=False, help="Decode the sampled frames with an ffmpeg pipe")
+    parser.add_argument('--crop', type=str, default='', required=False, help="Crop the ffmpeg frames to x,y,w,h")
+    parser.add_argument('--scale-width', type=int, default=0, required=False, help="Scale the ffmpeg frames to this width")
+    parser.add_argument('--incremental', type=bool, default=False, required=False, help="Threshold and search only the image tiles changed since the last frame")
+    parser.add_argument('--frame-index', type=bool, default=False, required=False, help="Seek with a sidecar keyframe and timestamp index, built on the first run")
+    parser.add_argument('--quality-window', type=int, default=1, required=False, help="Score n consecutive frames at each sample and recognize the sharpest")
+    parser.add_argument('--min-sharpness', type=float, default=0, required=False, help="Reject frames below this sharpness (laplacian variance) before recognition")
+    parser.add_argument('--debug-layers', type=str, default='', required=False, help="Comma separated debug overlay layers to render, all layers when empty")
     parser.add_argument('--training', type=bool, default=False, required=False, help="Output paddle trainning set")
+    return parser
+
+if __name__ == "__main__":
+    parser = new_parser("Process images from input path and save to output path.")
     
     main(parser.parse_args())
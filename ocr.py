@@ -1,7 +1,13 @@
+import os
+import queue
+from contextlib import contextmanager
+from typing import Iterator, Tuple
 import cv2
+import paddleocr
 from paddleocr import PaddleOCR
 from context import FrameContext
 from debug import _debug
+from ocrcache import OCRCache, crop_key
 
 class OCRResult:
     def __init__(self, paddle_res):
@@ -19,18 +25,67 @@ class OCRResult:
                 
 class OCR:
     __instance = None 
-    __ocr = None
+    # the paddle predictors are not thread safe, every thread checks out its own instance.
+    # each instance loads its own copy of the model weights, the paddle predictors do not
+    # share them, but threads of one process still share the code, opencv, the result cache
+    # and the page cache of the model files instead of a full process per worker.
+    __pool: queue.Queue = None
+    __size = 0
+    __cache: OCRCache = None
+    __version = ''
 
-    def __new__(cls):
+    def __new__(cls, cpu_threads: int = 10, pool_size: int = 1):
         if cls.__instance is None:
             cls.__instance = super().__new__(cls)
-            cls.__ocr = PaddleOCR(lang='en') 
+            cls.__size = max(1, pool_size)
+            cls.__pool = queue.Queue(cls.__size)
+
+            # cpu_threads also sizes the mkldnn math library threads, split between the instances
+            threads = max(1, cpu_threads // cls.__size)
+            for _ in range(cls.__size):
+                cls.__pool.put(PaddleOCR(lang='en', cpu_threads=threads))
+
+            # cached results are only valid for the same backend and recognition model
+            ocr = cls.__pool.queue[0]
+            rec_model_dir = getattr(getattr(ocr, 'args', None), 'rec_model_dir', '') or ''
+            cls.__version = f'paddleocr-{paddleocr.__version__}-{os.path.basename(os.path.normpath(rec_model_dir))}'
 
         return cls.__instance
+
+    @classmethod
+    @contextmanager
+    def __checkout(cls) -> Iterator[PaddleOCR]:
+        # blocks until an instance is returned when every instance is busy
+        ocr = cls.__pool.get()
+        try:
+            yield ocr
+        finally:
+            cls.__pool.put(ocr)
+
+    @classmethod
+    def use_cache(cls, cache: OCRCache):
+        cls.__cache = cache
+
+    @classmethod
+    def __cached(cls, ctx: FrameContext, name: str, img: cv2.Mat) -> Tuple[str, Tuple[str, float]]:
+        if cls.__cache is None:
+            return None, None
+
+        key = crop_key(img, cls.__version)
+        cached = cls.__cache.get(key)
+        if cached is not None:
+            _debug(ctx, lambda: print(f'{ctx.name}-{name}: cached {cached[0]}, {cached[1]}'))
+
+        return key, cached
     
     @classmethod
     def recognize(cls, ctx: FrameContext, name: str, img: cv2.Mat) -> str:
-        result = cls.__ocr.ocr(img, det=False, cls=False)
+        key, cached = cls.__cached(ctx, name, img)
+        if cached is not None:
+            return cached[0]
+
+        with cls.__checkout() as ocr:
+            result = ocr.ocr(img, det=False, cls=False)
 
         def __print_res():
             for idx in range(len(result)):
@@ -43,15 +98,53 @@ class OCR:
         if len(result) == 0 or \
             len(result[0]) == 0 or \
             len(result[0][0]) == 0:
+            if key is not None:
+                cls.__cache.put(key, '', 0.0)
             return ''
         
         res0 = result[0]
         res00 = res0[0]
+
+        if key is not None:
+            cls.__cache.put(key, res00[0], float(res00[1]))
+
         return res00[0]
         
+    @classmethod
+    def recognize_batch(cls, ctx: FrameContext, names: list[str], imgs: list[cv2.Mat]) -> list[Tuple[str, float]]:
+        if len(imgs) == 0:
+            return []
+
+        values: list[Tuple[str, float]] = [None] * len(imgs)
+        keys: list[str] = [None] * len(imgs)
+        for idx, (name, img) in enumerate(zip(names, imgs)):
+            keys[idx], values[idx] = cls.__cached(ctx, name, img)
+
+        misses = [idx for idx, value in enumerate(values) if value is None]
+        if len(misses) == 0:
+            return values
+
+        # recognition only, the crops are batched by paddle's text recognizer
+        with cls.__checkout() as ocr:
+            rec_res, _ = ocr.text_recognizer([imgs[idx] for idx in misses])
+
+        def __print_res():
+            for idx, line in zip(misses, rec_res):
+                print(f'{ctx.name}-{names[idx]}: {line[0]}, {line[1]}')
+
+        _debug(ctx, lambda: __print_res())
+
+        for idx, line in zip(misses, rec_res):
+            values[idx] = (line[0], float(line[1]))
+            if keys[idx] is not None:
+                cls.__cache.put(keys[idx], line[0], float(line[1]))
+
+        return values
+
     @classmethod
     def detect_panel(cls, ctx: FrameContext, img: cv2.Mat) -> list[OCRResult]:
-        rec_result = cls.__ocr.ocr(img, det=True, cls=False)
+        with cls.__checkout() as ocr:
+            rec_result = ocr.ocr(img, det=True, cls=False)
 
         def __print_res():
             for idx in range(len(rec_result)):
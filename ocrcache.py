@@ -0,0 +1,101 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Optional, Tuple
+
+import cv2
+
+NORMALIZED_SIZE = (96, 32)
+
+def crop_key(image: cv2.Mat, version: str) -> str:
+    # otsu binarized fixed size crop, exposure changes still hit but a crop shifted by a pixel misses
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    small = cv2.resize(gray, NORMALIZED_SIZE, interpolation=cv2.INTER_AREA)
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    digest = hashlib.sha1(binary.tobytes())
+    digest.update(version.encode())
+    return digest.hexdigest()
+
+class OCRCache:
+    def __init__(self, path: str, max_entries: int = 100000, evict_every: int = 1000):
+        self.path = path
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        self.__inserts = 0
+        # last use of the hits, written with the next insert instead of a commit per hit
+        self.__touched: dict[str, int] = {}
+
+        # shared by worker processes, wait for their writes instead of failing
+        self.__db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.__db.execute('PRAGMA journal_mode=WAL')
+        self.__db.execute('PRAGMA synchronous=NORMAL')
+        self.__db.execute('CREATE TABLE IF NOT EXISTS ocr (key TEXT PRIMARY KEY, value TEXT, score REAL, used INTEGER)')
+        self.__db.execute('CREATE INDEX IF NOT EXISTS ocr_used ON ocr (used)')
+        self.__db.commit()
+
+        row = self.__db.execute('SELECT MAX(used) FROM ocr').fetchone()
+        self.__clock = row[0] or 0
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self.__lock:
+            row = self.__db.execute('SELECT value, score FROM ocr WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.__clock += 1
+            self.__touched[key] = self.__clock
+            if len(self.__touched) >= self.evict_every:
+                self.__flush()
+                self.__db.commit()
+
+            return row[0], row[1]
+
+    def put(self, key: str, value: str, score: float):
+        with self.__lock:
+            self.__clock += 1
+            self.__touched.pop(key, None)
+            self.__db.execute('INSERT OR REPLACE INTO ocr (key, value, score, used) VALUES (?, ?, ?, ?)',
+                              (key, value, score, self.__clock))
+
+            self.__inserts += 1
+            if self.__inserts % self.evict_every == 0:
+                self.__evict()
+            else:
+                self.__flush()
+
+            self.__db.commit()
+
+    def flush(self):
+        with self.__lock:
+            self.__flush()
+            self.__db.commit()
+
+    def __flush(self):
+        if len(self.__touched) == 0:
+            return
+
+        self.__db.executemany('UPDATE ocr SET used = ? WHERE key = ?', [(used, key) for key, used in self.__touched.items()])
+        self.__touched = {}
+
+    def __evict(self):
+        # least recently used entries over the size bound, recent hits included
+        self.__flush()
+
+        count = self.__db.execute('SELECT COUNT(*) FROM ocr').fetchone()[0]
+        if count > self.max_entries:
+            self.__db.execute('DELETE FROM ocr WHERE key IN (SELECT key FROM ocr ORDER BY used LIMIT ?)',
+                              (count - self.max_entries,))
+
+    def close(self):
+        with self.__lock:
+            self.__evict()
+            self.__db.commit()
+            self.__db.close()
@@ -0,0 +1,63 @@
+from typing import Optional
+import cv2
+
+class Layer:
+    def __init__(self, name: str):
+        self.name = name
+        self.items: list[tuple] = []
+
+    def rect(self, box: list, color: cv2.typing.Scalar, thickness: int = 1):
+        self.items.append(('rect', list(box), color, thickness))
+
+    def line(self, pt1, pt2, color: cv2.typing.Scalar, thickness: int = 1):
+        self.items.append(('line', tuple(pt1), tuple(pt2), color, thickness))
+
+    def circle(self, center, radius: int, color: cv2.typing.Scalar, thickness: int = 1):
+        self.items.append(('circle', tuple(center), radius, color, thickness))
+
+    def text(self, text: str, org, color: cv2.typing.Scalar, scale: float = 0.5, thickness: int = 1):
+        self.items.append(('text', text, [int(org[0]), int(org[1])], scale, color, thickness))
+
+    def render(self, img: cv2.Mat):
+        for item in self.items:
+            match item[0]:
+                case 'rect':
+                    _, box, color, thickness = item
+                    cv2.rectangle(img, box, color, thickness)
+                case 'line':
+                    _, pt1, pt2, color, thickness = item
+                    cv2.line(img, pt1, pt2, color, thickness)
+                case 'circle':
+                    _, center, radius, color, thickness = item
+                    cv2.circle(img, center, radius, color, thickness)
+                case 'text':
+                    _, text, org, scale, color, thickness = item
+                    cv2.putText(img, text, org, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+
+class Overlay:
+    def __init__(self):
+        self.__layers: dict[str, Layer] = {}
+
+    def layer(self, name: str) -> Layer:
+        if not name in self.__layers:
+            self.__layers[name] = Layer(name)
+
+        return self.__layers[name]
+
+    def empty(self) -> bool:
+        return len(self.__layers) == 0
+
+    def render(self, image: cv2.Mat, names: Optional[list[str]] = None) -> Optional[cv2.Mat]:
+        # a single copy of the frame for every chosen layer, in recording order
+        layers = [layer for name, layer in self.__layers.items() if not names or name in names]
+        if len(layers) == 0:
+            return None
+
+        img = image.copy()
+        for layer in layers:
+            layer.render(img)
+
+        return img
+
+    def clear(self):
+        self.__layers = {}
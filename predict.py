@@ -0,0 +1,148 @@
+from typing import Callable, Optional
+
+import cv2
+import numpy as np
+
+SIGNATURE_SIZE = (32, 12)
+SIGNATURE_THRESHOLD = 64
+
+# frames between forced recognitions, the temperature is read every frame
+DISPLAY_RATES = {
+    'TEMPERATURE': 1,
+    'TIME': 4,
+    'POWER': 8,
+    'FAN': 8,
+    'PROFILE': 16,
+}
+
+def signature(image: cv2.Mat) -> np.ndarray:
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+    return cv2.resize(gray, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+def format_time(seconds: int) -> str:
+    return f'{seconds // 60:02d}{seconds % 60:02d}'
+
+def parse_time(value: str) -> Optional[int]:
+    value = value.replace(':', '')
+    if len(value) != 4 or not value.isdigit():
+        return None
+
+    return int(value[:2]) * 60 + int(value[2:])
+
+class DisplayPredictor:
+    def __init__(self, name: str, rate: int):
+        self.name = name
+        self.rate = rate
+
+        self.value = None
+        self.sec = 0.0
+        self.signature = None
+        self.frames = 0
+        # time display direction, counting up, down or stopped
+        self.step = None
+        self.last_step = None
+
+    def predict(self, sec: float, image: cv2.Mat) -> Optional[str]:
+        if self.value is None or self.frames + 1 >= self.rate:
+            return None
+
+        if self.name == 'TIME':
+            seconds = parse_time(self.value)
+            if seconds is None or self.step is None:
+                return None
+
+            # the roast timer runs with the video clock
+            return format_time(max(0, int(round(seconds + self.step * (sec - self.sec)))))
+
+        # unchanged crop, the reading is unchanged
+        sig = signature(image)
+        if self.signature is None or sig.shape != self.signature.shape:
+            return None
+
+        if np.max(np.abs(sig - self.signature)) > SIGNATURE_THRESHOLD:
+            return None
+
+        return self.value
+
+    def update(self, sec: float, value: str, image: cv2.Mat, recognized: bool):
+        if recognized:
+            if self.name == 'TIME' and self.value is not None:
+                self.__update_step(sec, value)
+
+            self.value = value
+            self.sec = sec
+            self.signature = signature(image)
+            self.frames = 0
+        else:
+            self.frames += 1
+
+    def __update_step(self, sec: float, value: str):
+        prev, cur = parse_time(self.value), parse_time(value)
+        if prev is None or cur is None or sec == self.sec:
+            self.step = None
+            return
+
+        rate = (cur - prev) / (sec - self.sec)
+        step = None
+        for candidate in [1, -1, 0]:
+            if abs(rate - candidate) <= 0.1:
+                step = candidate
+
+        # only predict once two readings in a row agree, a disagreeing reading is read again next frame
+        self.step = step if step is not None and step == self.last_step else None
+        self.last_step = step
+
+    def invalidate(self):
+        self.value = None
+        self.signature = None
+        self.step = None
+        self.last_step = None
+
+class Predictor:
+    def __init__(self):
+        self.recognized = 0
+        self.predicted = 0
+
+        self.__displays: dict[tuple[int, str], DisplayPredictor] = {}
+
+    def __get(self, panel: int, name: str) -> Optional[DisplayPredictor]:
+        if not name in DISPLAY_RATES:
+            return None
+
+        key = (panel, name)
+        if not key in self.__displays:
+            self.__displays[key] = DisplayPredictor(name, DISPLAY_RATES[name])
+
+        return self.__displays[key]
+
+    def predict(self, panel: int, name: str, sec: float, image: cv2.Mat) -> Optional[str]:
+        display = self.__get(panel, name)
+        if display is None or image is None:
+            return None
+
+        value = display.predict(sec, image)
+        if value is not None:
+            display.update(sec, value, image, False)
+            self.predicted += 1
+
+        return value
+
+    def update(self, panel: int, name: str, sec: float, value: str, image: cv2.Mat):
+        self.recognized += 1
+
+        display = self.__get(panel, name)
+        if display is not None and image is not None:
+            display.update(sec, value, image, True)
+
+    def recognize(self, panel: int, name: str, sec: float, image: cv2.Mat, detect: Callable[[], str]) -> str:
+        value = self.predict(panel, name, sec, image)
+        if value is None:
+            value = detect()
+            self.update(panel, name, sec, value, image)
+
+        return value
+
+    def invalidate(self, panel: int, name: str):
+        display = self.__get(panel, name)
+        if display is not None:
+            display.invalidate()
@@ -0,0 +1,104 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable
+
+class StackSampler:
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+
+    def __run(self):
+        while not self.__stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                frame = frame.f_back
+
+            if len(stack) > 0:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop.set()
+        self.__thread.join()
+
+class FrameProfiler:
+    def __init__(self, output_path: str, every: int, threshold: int, interval: float = 0.001, top: int = 25):
+        self.every = every
+        self.threshold = threshold
+        self.interval = interval
+        self.top = top
+
+        self.__output_path = os.path.join(output_path, '_profile')
+        os.makedirs(self.__output_path, exist_ok=True)
+
+        # collapsed stacks of every profiled frame, readable by flamegraph.pl / speedscope
+        # appended since parallel workers share the file
+        self.__folded = open(os.path.join(self.__output_path, 'profile.folded'), 'a')
+
+    def sampled(self, index: int) -> bool:
+        return self.every > 0 and index % self.every == 0
+
+    def slow(self, elapsed: int) -> bool:
+        return self.threshold > 0 and elapsed >= self.threshold
+
+    def run(self, name: str, fn: Callable, *args, keep: Callable[[int], bool] = None, memory: bool = True) -> Any:
+        # keep decides from the elapsed msec whether the profile is written,
+        # memory tracing slows the frame down a lot and is only done when asked for
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        profile = cProfile.Profile()
+
+        if memory:
+            tracemalloc.start()
+        sampler.start()
+        t1 = time.time()
+        try:
+            res = profile.runcall(fn, *args)
+        finally:
+            elapsed = int((time.time() - t1) * 1000)
+            sampler.stop()
+            snapshot, peak = None, 0
+            if memory:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+            if keep is None or keep(elapsed):
+                profile.dump_stats(os.path.join(self.__output_path, f'{name}.prof'))
+                if snapshot is not None:
+                    self.__write_memory(name, snapshot, peak, elapsed)
+                self.__write_stacks(name, sampler.stacks)
+
+        return res
+
+    def __write_memory(self, name: str, snapshot: tracemalloc.Snapshot, peak: int, elapsed: int):
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+        with open(os.path.join(self.__output_path, f'{name}.mem.txt'), 'w') as f:
+            f.write(f'elapsed: {elapsed} msec, peak: {peak / 1024:.1f} KiB\n')
+            for stat in snapshot.statistics('lineno')[:self.top]:
+                f.write(f'{stat}\n')
+
+    def __write_stacks(self, name: str, stacks: Counter):
+        for stack, count in stacks.items():
+            self.__folded.write(f'{name};{stack} {count}\n')
+        self.__folded.flush()
+
+    def close(self):
+        self.__folded.close()
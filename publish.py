@@ -0,0 +1,201 @@
+from abc import ABC, abstractmethod
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+from skywalker import Result
+
+def to_message(res: Result, elapsed: int, frame_time: float) -> bytes:
+    msg = {
+        'name': res.name,
+        'panel': res.panel,
+        'time': res.time,
+        'temperature': res.temperature,
+        'profile': res.profile,
+        'power': res.power,
+        'fan': res.fan,
+        'mode': res.mode,
+        'elapsed': elapsed,
+        # presentation time of the frame in the video, the name has the sampled second
+        'frame_time': frame_time,
+        'published': round(time.time(), 3),
+    }
+    return (json.dumps(msg) + '\n').encode()
+
+class Publisher(ABC):
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+
+    def publish(self, res: Result, elapsed: int, frame_time: float):
+        self.send(to_message(res, elapsed, frame_time))
+
+    @abstractmethod
+    def send(self, msg: bytes):
+        pass
+
+    def close(self):
+        pass
+
+class StdoutPublisher(Publisher):
+    def __init__(self, max_queue: int = 100):
+        super().__init__()
+
+        # stdout carries the ndjson stream only. fd 1 is pointed at stderr, so log prints,
+        # native library output and spawned workers inheriting fd 1 all stay out of the stream
+        sys.stdout.flush()
+        self.__out = os.fdopen(os.dup(1), 'wb')
+        os.dup2(2, 1)
+
+        self.__queue = queue.Queue(max_queue)
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        while True:
+            msg = self.__queue.get()
+            if msg is None:
+                return
+
+            self.__out.write(msg)
+            self.__out.flush()
+
+    def send(self, msg: bytes):
+        try:
+            self.__queue.put_nowait(msg)
+            self.sent += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        # a stuck consumer must not hang the run
+        try:
+            self.__queue.put(None, timeout=1)
+        except queue.Full:
+            pass
+        self.__thread.join(timeout=1)
+
+class Client:
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.pending = bytearray()
+
+class StreamPublisher(Publisher):
+    def __init__(self, server: socket.socket, max_pending: int = 64 * 1024):
+        super().__init__()
+        self.max_pending = max_pending
+
+        self.__server = server
+        self.__server.setblocking(False)
+        self.__server.listen()
+        self.__clients: list[Client] = []
+
+    def __accept(self):
+        while True:
+            try:
+                conn, _ = self.__server.accept()
+            except BlockingIOError:
+                return
+
+            conn.setblocking(False)
+            self.__clients.append(Client(conn))
+
+    def __flush(self, client: Client) -> bool:
+        try:
+            sent = client.conn.send(client.pending)
+            del client.pending[:sent]
+        except BlockingIOError:
+            pass
+        except OSError:
+            client.conn.close()
+            return False
+
+        return True
+
+    def send(self, msg: bytes):
+        self.__accept()
+
+        clients: list[Client] = []
+        for client in self.__clients:
+            # slow consumers lose whole messages, never partial lines
+            if len(client.pending) + len(msg) > self.max_pending:
+                self.dropped += 1
+            else:
+                client.pending.extend(msg)
+                self.sent += 1
+
+            if self.__flush(client):
+                clients.append(client)
+
+        self.__clients = clients
+
+    def close(self):
+        for client in self.__clients:
+            client.conn.close()
+        self.__server.close()
+
+class UnixPublisher(StreamPublisher):
+    def __init__(self, path: str):
+        if os.path.exists(path):
+            os.unlink(path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        self.path = path
+
+        super().__init__(server)
+
+    def close(self):
+        super().close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+class TcpPublisher(StreamPublisher):
+    def __init__(self, host: str, port: int):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((host, port))
+
+        super().__init__(server)
+
+class UdpPublisher(Publisher):
+    def __init__(self, host: str, port: int):
+        super().__init__()
+        self.address = (host, port)
+
+        self.__sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.__sock.setblocking(False)
+
+    def send(self, msg: bytes):
+        try:
+            self.__sock.sendto(msg, self.address)
+            self.sent += 1
+        except OSError:
+            # a network error only loses the message, never the run
+            self.dropped += 1
+
+    def close(self):
+        self.__sock.close()
+
+def new_publisher(target: str) -> Publisher:
+    # stdout | unix:<path> | tcp:<host>:<port> | udp:<host>:<port>
+    if target == 'stdout':
+        return StdoutPublisher()
+
+    kind, _, address = target.partition(':')
+    if kind == 'unix':
+        return UnixPublisher(address)
+
+    if kind in ['tcp', 'udp']:
+        host, _, port = address.rpartition(':')
+        if not port.isdigit():
+            raise ValueError(f'invalid publish address {target}')
+
+        host = host or '127.0.0.1'
+        return TcpPublisher(host, int(port)) if kind == 'tcp' else UdpPublisher(host, int(port))
+
+    raise ValueError(f'invalid publish target {target}')
@@ -0,0 +1,54 @@
+from typing import Optional, Tuple
+import cv2
+
+from utils import Rect
+
+PROBE_WIDTH = 480
+SATURATED_THRESHOLD = 250
+MAX_SATURATED_RATIO = 0.2
+
+def frame_quality(image: cv2.Mat, roi: Optional[Rect] = None) -> Tuple[float, float]:
+    # sharpness as laplacian variance and the share of blown out pixels, on a downscaled gray roi
+    if roi is not None:
+        image = image[roi.y:roi.y2(), roi.x:roi.x2()]
+
+    height, width = image.shape[:2]
+    if width > PROBE_WIDTH:
+        image = cv2.resize(image, (PROBE_WIDTH, max(1, int(height * PROBE_WIDTH / width))), interpolation=cv2.INTER_AREA)
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if len(image.shape) == 3 else image
+
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    saturated = cv2.countNonZero(cv2.inRange(gray, SATURATED_THRESHOLD, 255)) / gray.size
+
+    return sharpness, saturated
+
+def is_readable(quality: Tuple[float, float], min_sharpness: float) -> bool:
+    sharpness, saturated = quality
+    return sharpness >= min_sharpness and saturated <= MAX_SATURATED_RATIO
+
+def best_frame(frames: list[cv2.Mat], min_sharpness: float, roi: Optional[Rect] = None) -> Optional[cv2.Mat]:
+    # sharpest frame without glare, none when every frame in the window is unreadable
+    best, best_sharpness = None, -1.0
+    for frame in frames:
+        quality = frame_quality(frame, roi)
+        if not is_readable(quality, min_sharpness):
+            continue
+
+        if quality[0] > best_sharpness:
+            best, best_sharpness = frame, quality[0]
+
+    return best
+
+def layout_roi(rects: dict[str, Rect], width: int, height: int) -> Optional[Rect]:
+    if len(rects) == 0:
+        return None
+
+    x = max(0, min([rect.x for rect in rects.values()]))
+    y = max(0, min([rect.y for rect in rects.values()]))
+    x2 = min(width, max([rect.x2() for rect in rects.values()]))
+    y2 = min(height, max([rect.y2() for rect in rects.values()]))
+    if x2 <= x or y2 <= y:
+        return None
+
+    return Rect([x, y, x2 - x, y2 - y])
@@ -0,0 +1,96 @@
+import json
+import shutil
+import subprocess
+import threading
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+from utils import Rect
+
+def has_ffmpeg() -> bool:
+    return shutil.which('ffmpeg') is not None and shutil.which('ffprobe') is not None
+
+def probe_size(path: str) -> Tuple[int, int]:
+    out = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+                          '-show_entries', 'stream=width,height:stream_tags=rotate:stream_side_data=rotation',
+                          '-of', 'json', path], capture_output=True, check=True).stdout
+    stream = json.loads(out)['streams'][0]
+    width, height = int(stream['width']), int(stream['height'])
+
+    # ffmpeg rotates by the display matrix, like opencv does
+    rotation = stream.get('tags', {}).get('rotate', 0)
+    for side_data in stream.get('side_data_list', []):
+        rotation = side_data.get('rotation', rotation)
+    if abs(int(float(rotation))) % 180 == 90:
+        width, height = height, width
+
+    return width, height
+
+class RawVideo:
+    def __init__(self, path: str, crop: Optional[Rect] = None, scale_width: int = 0):
+        self.path = path
+        self.crop = crop
+
+        width, height = probe_size(path)
+        if crop is not None:
+            width, height = crop.w, crop.h
+
+        self.scale = scale_width > 0 and scale_width != width
+        if self.scale:
+            height = max(1, int(round(height * scale_width / width)))
+            width = scale_width
+
+        self.width = width
+        self.height = height
+
+    def __filters(self, interval: float) -> str:
+        filters = [f'fps=1/{interval}']
+        if self.crop is not None:
+            filters.append(f'crop={self.crop.w}:{self.crop.h}:{self.crop.x}:{self.crop.y}')
+        if self.scale:
+            filters.append(f'scale={self.width}:{self.height}:flags=area')
+
+        return ','.join(filters)
+
+    def frames(self, start: float, interval: float) -> Iterator[Tuple[float, np.ndarray]]:
+        # the same buffer is filled for every frame, it is only valid until the next one is read
+        cmd = ['ffmpeg', '-v', 'error', '-nostdin', '-ss', str(start), '-i', self.path,
+               '-vf', self.__filters(interval), '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-']
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        view = memoryview(frame).cast('B')
+        size = len(view)
+
+        # errors only, read at the end so a chatty ffmpeg cannot fill the pipe and stall
+        errors = []
+        reader = threading.Thread(target=lambda: errors.append(proc.stderr.read()), daemon=True)
+        reader.start()
+
+        finished = False
+        try:
+            idx = 0
+            while True:
+                read = 0
+                while read < size:
+                    n = proc.stdout.readinto(view[read:])
+                    if not n:
+                        finished = True
+                        return
+                    read += n
+
+                yield start + idx * interval, frame
+                idx += 1
+        finally:
+            proc.stdout.close()
+            if proc.poll() is None and not finished:
+                proc.terminate()
+            proc.wait()
+            reader.join()
+            proc.stderr.close()
+
+            # a stream that ended on its own must have ended cleanly
+            if finished and proc.returncode != 0:
+                message = errors[0].decode(errors='replace').strip() if len(errors) > 0 else ''
+                raise RuntimeError(f'ffmpeg failed with exit code {proc.returncode}: {message}')
@@ -0,0 +1,91 @@
+import os
+from typing import Optional
+
+import cv2
+import numpy as np
+
+THREAD_ENV_VARS = ['OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS']
+
+def read_cpu_times() -> Optional[dict[int, tuple[int, int]]]:
+    # per core (busy, total) jiffies, linux only
+    if not os.path.isfile('/proc/stat'):
+        return None
+
+    times: dict[int, tuple[int, int]] = {}
+    with open('/proc/stat', 'r') as f:
+        for line in f:
+            cols = line.split()
+            if not cols[0].startswith('cpu') or cols[0] == 'cpu':
+                continue
+
+            values = [int(v) for v in cols[1:]]
+            idle = values[3] + values[4]
+            total = sum(values[:8])
+            times[int(cols[0][3:])] = (total - idle, total)
+
+    return times
+
+class ResourceManager:
+    def __init__(self, workers: int = 1, pin: bool = False):
+        if hasattr(os, 'sched_getaffinity'):
+            self.cores = sorted(os.sched_getaffinity(0))
+        else:
+            self.cores = list(range(os.cpu_count() or 1))
+
+        self.workers = max(1, min(workers, len(self.cores)))
+        self.pin = pin
+
+        self.__start_times = None
+
+    def allocate(self) -> list[list[int]]:
+        return [[int(core) for core in cores] for cores in np.array_split(self.cores, self.workers)]
+
+    def threads(self) -> int:
+        return len(self.cores) // self.workers
+
+    def configure_env(self):
+        # read by openmp / mkl when paddle starts, set before spawning workers
+        for var in THREAD_ENV_VARS:
+            os.environ[var] = str(self.threads())
+
+    @staticmethod
+    def configure(cores: list[int], pin: bool) -> int:
+        threads = len(cores)
+        for var in THREAD_ENV_VARS:
+            os.environ[var] = str(threads)
+
+        cv2.setNumThreads(threads)
+
+        if pin and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cores)
+
+        return threads
+
+    def start(self):
+        self.__start_times = read_cpu_times()
+
+    def utilization(self) -> dict[int, float]:
+        end_times = read_cpu_times()
+        if self.__start_times is None or end_times is None:
+            return {}
+
+        usage: dict[int, float] = {}
+        for core in self.cores:
+            if not core in self.__start_times or not core in end_times:
+                continue
+
+            busy1, total1 = self.__start_times[core]
+            busy2, total2 = end_times[core]
+            if total2 > total1:
+                usage[core] = round((busy2 - busy1) / (total2 - total1) * 100, 1)
+
+        return usage
+
+    def report(self):
+        usage = self.utilization()
+        if len(usage) == 0:
+            return
+
+        print(f'cpu utilization ({self.workers} workers x {self.threads()} threads): ' +
+              ', '.join([f'cpu{core}: {pct}%' for core, pct in usage.items()]) +
+              f', mean: {round(sum(usage.values()) / len(usage), 1)}%')
@@ -0,0 +1,161 @@
+import json
+import mmap
+import os
+import struct
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from utils import Rect
+
+MAGIC = b'SKYROI01'
+HEADER = struct.Struct('<8sQ')
+
+class CachedDisplay:
+    def __init__(self, name: str, rect: Rect, skip_detect: bool, image: cv2.Mat):
+        self.name = name
+        self.rect = rect
+        self.skip_detect = skip_detect
+        self.image = image
+
+class CachedFrame:
+    def __init__(self, name: str, sec: float, width: int, height: int, displays: list[CachedDisplay]):
+        self.name = name
+        self.sec = sec
+        self.width = width
+        self.height = height
+        self.displays = displays
+
+def journal_path(path: str) -> str:
+    return f'{path}.index'
+
+class ROICacheWriter:
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.__index = []
+
+        if append and os.path.isfile(path):
+            # new crops overwrite the old index, the merged index is written on close
+            self.__file = open(path, 'r+b')
+            end = self.__recover()
+            if end is not None:
+                self.__file.seek(end)
+                self.__file.truncate()
+                self.__open_journal()
+                return
+
+            print(f'roi cache {path} has no index, starting it over')
+            self.__file.close()
+
+        self.__file = open(path, 'wb')
+        self.__file.write(HEADER.pack(MAGIC, 0))
+        self.__open_journal()
+
+    def __recover(self) -> Optional[int]:
+        header = self.__file.read(HEADER.size)
+        magic, index_offset = HEADER.unpack(header) if len(header) == HEADER.size else (None, 0)
+        if magic != MAGIC:
+            return None
+
+        if index_offset > 0:
+            self.__file.seek(index_offset)
+            self.__index = json.loads(self.__file.read().decode())
+            return index_offset
+
+        # not closed, the journal has every frame whose crops were written before the crash
+        if not os.path.isfile(journal_path(self.path)):
+            return None
+
+        size = os.path.getsize(self.path)
+        end = HEADER.size
+        with open(journal_path(self.path), 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+
+                entry_end = max([display['offset'] + int(np.prod(display['shape'])) for display in entry['displays']], default=end)
+                if entry_end > size:
+                    break
+
+                self.__index.append(entry)
+                end = max(end, entry_end)
+
+        return end
+
+    def __open_journal(self):
+        # one line per frame, a crashed run is resumed from it
+        self.__journal = open(journal_path(self.path), 'w')
+        for entry in self.__index:
+            self.__journal.write(json.dumps(entry) + '\n')
+        self.__journal.flush()
+
+    def write(self, name: str, sec: float, width: int, height: int, displays: list):
+        entry = {'name': name, 'sec': sec, 'width': width, 'height': height, 'displays': []}
+
+        for display in displays:
+            image = np.ascontiguousarray(display.get_image())
+            entry['displays'].append({
+                'name': display.name,
+                'rect': display.rect.to_list(),
+                'skip_detect': display.skip_detect,
+                'offset': self.__file.tell(),
+                'shape': list(image.shape),
+            })
+            self.__file.write(image.tobytes())
+
+        self.__index.append(entry)
+
+        # crops before the journal line, a line never points past the written data
+        self.__file.flush()
+        self.__journal.write(json.dumps(entry) + '\n')
+        self.__journal.flush()
+
+    def close(self):
+        # index goes at the end, the header points to it
+        index_offset = self.__file.tell()
+        self.__file.write(json.dumps(self.__index).encode())
+        self.__file.seek(0)
+        self.__file.write(HEADER.pack(MAGIC, index_offset))
+        self.__file.close()
+
+        self.__journal.close()
+        os.remove(journal_path(self.path))
+
+class ROICacheReader:
+    def __init__(self, path: str):
+        self.path = path
+
+        self.__file = open(path, 'rb')
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_offset = HEADER.unpack_from(self.__mmap, 0)
+        if magic != MAGIC or index_offset == 0:
+            raise ValueError(f'invalid roi cache file: {path}')
+
+        entries = json.loads(self.__mmap[index_offset:].decode())
+        self.__index = {entry['sec']: entry for entry in entries}
+
+    def timestamps(self) -> list[float]:
+        return sorted(self.__index.keys())
+
+    def read(self, sec: float) -> Optional[CachedFrame]:
+        entry = self.__index.get(sec)
+        if entry is None:
+            return None
+
+        displays: list[CachedDisplay] = []
+        for display in entry['displays']:
+            shape = display['shape']
+            # zero copy view into the mapped file
+            image = np.frombuffer(self.__mmap, dtype=np.uint8, count=int(np.prod(shape)),
+                                  offset=display['offset']).reshape(shape)
+            displays.append(CachedDisplay(display['name'], Rect(display['rect']), display['skip_detect'], image))
+
+        return CachedFrame(entry['name'], entry['sec'], entry['width'], entry['height'], displays)
+
+    def close(self):
+        self.__mmap.close()
+        self.__file.close()
@@ -0,0 +1,145 @@
+import bisect
+import glob
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+def is_sequence(path: str) -> bool:
+    # a video named like roast [1].mp4 is not a glob
+    if os.path.isfile(path):
+        return False
+
+    return os.path.isdir(path) or glob.has_magic(path)
+
+def natural_key(path: str) -> list:
+    # frame_9.jpg before frame_10.jpg
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', os.path.basename(path))]
+
+def exif_time(path: str) -> Optional[float]:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        with Image.open(path) as img:
+            exif = img.getexif()
+            value = exif.get_ifd(0x8769).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    except (OSError, ValueError):
+        return None
+
+    if not value:
+        return None
+
+    try:
+        return time.mktime(time.strptime(str(value).strip(), '%Y:%m:%d %H:%M:%S'))
+    except ValueError:
+        return None
+
+def name_time(path: str) -> Optional[float]:
+    # camera style names like IMG_20240131_154502.jpg
+    match = re.search(r'(\d{8})[_T-]?(\d{6})', os.path.basename(path))
+    if match is None:
+        return None
+
+    try:
+        return time.mktime(time.strptime(match.group(1) + match.group(2), '%Y%m%d%H%M%S'))
+    except ValueError:
+        return None
+
+class ImageSequence:
+    def __init__(self, path: str, order: str = 'name', workers: int = 4, prefetch: int = 8, interval: float = 1):
+        self.path = path
+        self.workers = workers
+        self.prefetch = prefetch
+
+        if os.path.isdir(path):
+            paths = [os.path.join(path, name) for name in os.listdir(path)]
+        else:
+            paths = glob.glob(path)
+        paths = [p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS)]
+        if len(paths) == 0:
+            raise ValueError(f"No images found: {path}")
+
+        stamps = {}
+        if order == 'name':
+            paths.sort(key=natural_key)
+
+            # the time in the names when every name has one, one interval per image otherwise
+            for p in paths:
+                stamps[p] = name_time(p)
+            if any([stamp is None for stamp in stamps.values()]):
+                stamps = {p: idx * interval for idx, p in enumerate(paths)}
+        else:
+            # capture time from exif when asked for and present, file modification time otherwise
+            for p in paths:
+                stamp = exif_time(p) if order == 'exif' else None
+                stamps[p] = stamp if stamp is not None else os.path.getmtime(p)
+
+            paths.sort(key=lambda p: (stamps[p], natural_key(p)))
+
+        start = min(stamps.values())
+        self.paths = paths
+        # offsets from the first capture, kept increasing in the chosen order
+        self.secs = []
+        for p in paths:
+            sec = round(stamps[p] - start, 3)
+            self.secs.append(max(sec, self.secs[-1]) if len(self.secs) > 0 else sec)
+
+    def sample(self, skip: float, interval: float, count: int = 0) -> list[float]:
+        # the first image at or after every interval step
+        secs = []
+        next_sec = skip
+        for sec in self.secs:
+            if sec < next_sec:
+                continue
+
+            secs.append(sec)
+            next_sec = sec + interval
+            if count > 0 and len(secs) >= count:
+                break
+
+        return secs
+
+    def find(self, sec: float) -> Optional[str]:
+        # the image at or right after the timestamp
+        idx = bisect.bisect_left(self.secs, sec)
+        if idx >= len(self.paths):
+            return None
+
+        return self.paths[idx]
+
+    def frames(self, secs: Iterable[float]) -> Iterator[Tuple[float, Optional[cv2.Mat]]]:
+        # decode ahead in a thread pool, bounded so memory stays flat on long sequences
+        with ThreadPoolExecutor(self.workers) as executor:
+            pending = deque()
+            secs = iter(secs)
+
+            def submit() -> bool:
+                for sec in secs:
+                    path = self.find(sec)
+                    if path is None:
+                        return False
+
+                    pending.append((sec, executor.submit(cv2.imread, path)))
+                    return True
+
+                return False
+
+            while len(pending) < self.prefetch and submit():
+                pass
+
+            while len(pending) > 0:
+                sec, future = pending.popleft()
+                submit()
+
+                yield sec, future.result()
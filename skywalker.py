@@ -2,13 +2,20 @@
 import math
 from typing import Optional, Tuple
 import cv2
-from aoi import find_aoi
+from concurrent.futures import ThreadPoolExecutor
+from aoi import AOI, find_aoi
 from context import FrameContext
 from debug import _debug, _debug_displays, _debug_projection
 from display import Digit, Display
+from layout import PanelLayout
 from ocr import OCR, OCRResult
+from roicache import CachedFrame
+from tiles import threshold_gray
 from training import RecognitionResult, RecognitionTraining
-from utils import Rect, calculate_projection, find_central_box_index, find_projection_rect_index
+from utils import Rect, RectArray, calculate_projection, cluster_rects, find_central_box_index, find_projection_rect_index
+
+# center distance in power display heights that still links two displays of one panel
+MIN_LINK_RATIO = 5.5
 
 class Section:
     def __init__(self, name: str, angle: float, length: float, skip_detect: bool = False):
@@ -18,8 +25,9 @@ class Section:
         self.skip_detect = skip_detect
 
 class Result:
-    def __init__(self, name: str):
+    def __init__(self, name: str, panel: int = 0):
         self.name = name
+        self.panel = panel
         self.temperature = 0
         self.profile = ""
         self.power = 0
@@ -31,6 +39,7 @@ class Result:
 class SkyWalker():
     def __init__(self, ctx: FrameContext):
         self.ctx = ctx
+        self.displays: dict[str, Display] = {}
 
         self.__init_sections()
         self.minAreaSize = 50
@@ -47,20 +56,32 @@ class SkyWalker():
             "MODE_COOL": Section("MODE_COOL", 54.85, 4.77, True),
         }
 
+        # fitted angle and length from the rig calibration profile
+        if self.ctx.calibration is not None:
+            for name, (angle, length) in self.ctx.calibration.sections.items():
+                if name in self.__sections:
+                    self.__sections[name].angle = angle
+                    self.__sections[name].length = length
+
     def __preprocess_image(self) -> cv2.Mat:
         ctx = self.ctx
         gray_image = cv2.cvtColor(ctx.image, cv2.COLOR_BGR2GRAY)
 
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (10, 10)) 
-        dilated_image = cv2.dilate(gray_image, kernel, iterations=1)
+        return threshold_gray(gray_image)
 
-        _, threshold_image = cv2.threshold(dilated_image, 200, 255, cv2.THRESH_BINARY) 
+    def __find_aois(self) -> Tuple[cv2.Mat, list[AOI]]:
+        if self.ctx.tiles is None:
+            threshold_image = self.__preprocess_image()
+            return threshold_image, find_aoi(self.ctx, threshold_image, 100)
 
-        return threshold_image
+        # only the tiles changed since the last frame are thresholded and searched again
+        threshold_image, boxes = self.ctx.tiles.preprocess(self.ctx.rotation, self.ctx.image)
+        return threshold_image, find_aoi(self.ctx, threshold_image, 100, boxes=boxes)
 
-    def __detect_displays(self, threshold_image) -> list[Display]:
-        aois = find_aoi(self.ctx, threshold_image, 100)
+    def __detect_displays(self, threshold_image, aois: list[AOI]) -> list[Display]:
+        return self.__match_displays(aois, threshold_image)
 
+    def __match_displays(self, aois: list[AOI], threshold_image) -> list[Display]:
         if not aois or len(aois) == 0:
             return None
 
@@ -75,12 +96,14 @@ class SkyWalker():
         
         _debug(self.ctx, lambda: _debug_projection(self.ctx, rects))
 
+        # every section is matched against the same rects
+        rect_array = RectArray(rects)
         for section in self.__sections.values():
             if section.name == 'POWER':
                 continue
 
             pt_check = calculate_projection(aoi.rect.projected(), section.length, section.angle)
-            idx2 = find_projection_rect_index(pt_check, rects)
+            idx2 = find_projection_rect_index(pt_check, rect_array)
 
             if idx2 is None:
                 continue
@@ -113,10 +136,8 @@ class SkyWalker():
         larger:dict[str, Display] = {}
         for name, display in displays.items():
             rect = display.rect 
-            rect.x = max(0, rect.x - 10)
-            rect.y = max(0, rect.y - 10)
-            rect.w = min(threshold_image.shape[1], rect.w + 10)
-            rect.h = min(threshold_image.shape[0], rect.h + 10)
+            rect = Rect([max(0, rect.x - 10), max(0, rect.y - 10), 
+                         min(threshold_image.shape[1], rect.w + 10), min(threshold_image.shape[0], rect.h + 10)])
 
             larger[name] = Display(self.ctx, display.name, rect, display.digits)
 
@@ -143,9 +164,9 @@ class SkyWalker():
         _debug(self.ctx, lambda: _debug_projection(self.ctx, rects))
 
         def __debug_distance():
-            img = self.ctx.image.copy()
+            layer = self.ctx._layer('distances')
             
-            cv2.circle(img, Rect(res.box).projected().center(), 3, (0, 255, 0), 3)
+            layer.circle(Rect(res.box).projected().center(), 3, (0, 255, 0), 3)
 
             pt_checks = []
             for section in self.__sections.values():
@@ -154,17 +175,17 @@ class SkyWalker():
 
                 pt_check = calculate_projection(Rect(res.box), section.length, section.angle)
                 pt_checks.append(pt_check)
-                cv2.circle(img, pt_check, 3, (0, 0, 255), 3)
+                layer.circle(pt_check, 3, (0, 0, 255), 3)
 
             for rect in rects:
 
                 if rect == Rect(res.box):
                     continue
-                cv2.rectangle(img, rect.to_list(), (0, 0, 255), 1)
+                layer.rect(rect.to_list(), (0, 0, 255), 1)
                 pt2 = rect.projected().center()
-                cv2.rectangle(img, rect.projected().to_list(), (0, 0, 255), 1)
+                layer.rect(rect.projected().to_list(), (0, 0, 255), 1)
 
-                cv2.circle(img, pt2, 3, (0, 255, 255), 2)
+                layer.circle(pt2, 3, (0, 255, 255), 2)
                 min_distance = 9999999999999
                 pt = []
                 for pt_check in pt_checks:
@@ -173,20 +194,19 @@ class SkyWalker():
                     if distance == min_distance:
                         pt = pt_check
 
-                cv2.line(img, pt, pt2, (0, 255,255), 1)
-                cv2.putText(img, f'{min_distance} - {rect.h * 2}', [pt2[0] + 5, pt2[1]], cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0), 2)
-            
-            self.ctx._write_step(f'distances', img)
+                layer.line(pt, pt2, (0, 255,255), 1)
+                layer.text(f'{min_distance} - {rect.h * 2}', [pt2[0] + 5, pt2[1]], (0,255,0), 1, 2)
                 
         _debug(self.ctx, lambda: __debug_distance())
 
 
+        rect_array = RectArray(rects)
         for section in self.__sections.values():
             if section.name == 'POWER':
                 continue
 
             pt_check = calculate_projection(Rect(res.box), section.length, section.angle)
-            idx2 = find_projection_rect_index(pt_check, rects)
+            idx2 = find_projection_rect_index(pt_check, rect_array)
 
             if idx2 is None:
                 continue
@@ -226,11 +246,26 @@ class SkyWalker():
         return total_seconds
 
     def detect(self) -> Optional[Result]:
-        processed_image = self.__preprocess_image()
+        # calibrated rigs go straight to cropping and recognition
+        layout = self.ctx.layout
+        height, width = self.ctx.image.shape[:2]
+        # the layout of another rotation is kept for the attempt it was fitted at
+        if layout is not None and layout.pinned() and layout.matches(self.ctx.rotation, width, height):
+            if layout.valid():
+                self.ctx._write_step(f'frame', self.ctx.image)
+                res = self.__detect_cached(layout)
+                if res is not None:
+                    return res
+
+                print(f'{self.ctx.name} - calibrated layout failed, redetecting')
+
+            layout.reset()
+
+        processed_image, aois = self.__find_aois()
 
         self.ctx._write_step(f'frame', self.ctx.image)
 
-        displays = self.__detect_displays(processed_image)
+        displays = self.__detect_displays(processed_image, aois)
 
         if not displays:
             print('skywalker display not found')
@@ -240,14 +275,27 @@ class SkyWalker():
             print('skywalker power display not found')
             return None
         
+        res = self.__read_displays(displays)
+
+        # detected boxes, for the rotation tried first and the quality roi
+        if layout is not None and not layout.pinned():
+            layout.update({key: disp.rect for key, disp in displays.items()}, self.ctx.rotation, width, height)
+
+        self.displays = displays
+        return res
+
+    def __read_displays(self, displays: dict[str, Display], panel: int = 0) -> Result:
         _debug(self.ctx, lambda: _debug_displays(self.ctx, {key: disp.rect for key, disp in displays.items()}))
                 
         orig_res : dict[str, str] = {}
         
-        res:Result = Result(self.ctx.name)
+        res:Result = Result(self.ctx.name, panel)
         for display in displays.values():
             if not display.skip_detect:
-                value = display.detect()
+                if self.ctx.predictor is not None:
+                    value = self.ctx.predictor.recognize(panel, display.name, self.ctx.time, display.get_image(), display.detect)
+                else:
+                    value = display.detect()
                 _debug(self.ctx, lambda: print(f'{self.ctx.name}-{display.name}: {value}'))
             else:
                 if display.name in ["MODE_PREHEAT", "MODE_ROAST", "MODE_COOL"]:
@@ -271,9 +319,13 @@ class SkyWalker():
                         res.mode = value
 
             except ValueError as e:
+                if self.ctx.predictor is not None:
+                    self.ctx.predictor.invalidate(panel, display.name)
+                self.ctx.fail(f'{display.name} failed to convert result ({value}): {e}')
                 print(f'{self.ctx.name} - {display.name} failed to convert result ({value}): {e}')
             
             if self.ctx.options.training:
+                panel_suffix = f'_panel{panel}' if panel > 0 else ''
                 fix_value = value
                 if display.name == "TIME":
                     fix_value = value.replace('.', '-')
@@ -281,53 +333,30 @@ class SkyWalker():
                 if display.name == "PROFILE":
                     fix_value = value.replace('O', '0')
 
-                RecognitionTraining().write_result(self.ctx.image, RecognitionResult(f'{self.ctx.name}_{display.name.lower()}', fix_value, display.rect.to_list()))
+                # the display crop, replayed frames have no full image
+                image = display.get_image()
+                RecognitionTraining().write_result(image, RecognitionResult(f'{self.ctx.name}{panel_suffix}_{display.name.lower()}', fix_value, 
+                                                                            [0, 0, image.shape[1], image.shape[0]]))
 
         def _write_diag():
-            img = self.ctx.image
+            layer = self.ctx._layer('result')
             for display in displays.values():
                 box = display.rect.to_list()
-                cv2.rectangle(img, box, (0, 0, 255), 1)
+                layer.rect(box, (0, 0, 255), 1)
 
-                cv2.putText(img, f'{display.name}: {orig_res[display.name]}', [box[0], box[1] - 20], cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0), 2)
-                
-            self.ctx._write_step(f'result', img)
+                layer.text(f'{display.name}: {orig_res[display.name]}', [box[0], box[1] - 20], (0,255,0), 1, 2)
 
         _debug(self.ctx, lambda: _write_diag())
 
         return res
 
-    def detect_panel(self) -> Optional[Result]:
-        self.ctx._write_step(f'frame', self.ctx.image)
-
-        results = OCR().detect_panel(self.ctx, self.ctx.image)
-        
-        def __debug_results():
-            img = self.ctx.image.copy()
-            for res in results:
-                box = res.box
-                cv2.rectangle(img, box, (0,255,0),1)
-                cv2.putText(img, f'{res.value}', [box[0], box[1] - 20], cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0), 2)
-
-            self.ctx._write_step(f'aois', img) 
-
-        _debug(self.ctx, lambda: __debug_results())
-
-        displays = self.__detect_panel(results)
-
-        if not displays:
-            print('skywalker display not found')
-            return None
-
-        if not 'POWER' in displays:
-            print('skywalker power display not found')
-            return None
-        
+    def __panel_result(self, displays: dict[str, Display], panel: int = 0) -> Tuple[Result, bool]:
         _debug(self.ctx, lambda: _debug_displays(self.ctx, {key: disp.rect for key, disp in displays.items()}))
                 
         orig_res : dict[str, str] = {}
+        failed = False
         
-        res:Result = Result(self.ctx.name)
+        res:Result = Result(self.ctx.name, panel)
         for display in displays.values():
             value = display.value
             if not display.skip_detect:
@@ -353,18 +382,197 @@ class SkyWalker():
                         res.mode = value
 
             except ValueError as e:
+                failed = True
+                if self.ctx.predictor is not None:
+                    self.ctx.predictor.invalidate(panel, display.name)
                 print(f'{self.ctx.name} - {display.name} failed to convert result ({value}): {e}')
 
         def _write_diag():
-            img = self.ctx.image.copy()
+            layer = self.ctx._layer('result')
             for display in displays.values():
                 box = display.rect.to_list()
-                cv2.rectangle(img, box, (0, 0, 255), 1)
+                layer.rect(box, (0, 0, 255), 1)
 
-                cv2.putText(img, f'{display.name}: {orig_res[display.name]}', [box[0], box[1] - 20], cv2.FONT_HERSHEY_SIMPLEX, 1, (0,255,0), 2)
-                
-            self.ctx._write_step(f'result', img)
+                layer.text(f'{display.name}: {orig_res[display.name]}', [box[0], box[1] - 20], (0,255,0), 1, 2)
 
         _debug(self.ctx, lambda: _write_diag())
 
+        return res, failed
+
+    def __detect_cached(self, layout: PanelLayout) -> Optional[Result]:
+        height, width = self.ctx.image.shape[:2]
+        if not layout.validate(width, height):
+            return None
+
+        displays: dict[str, Display] = {}
+        for name, rect in layout.rects().items():
+            display = Display(self.ctx, name, rect, None)
+            display.skip_detect = self.__sections[name].skip_detect
+            displays[name] = display
+
+        images = [display.get_image() for display in displays.values()]
+        if any(img is None or img.size == 0 for img in images):
+            return None
+
+        # displays with a trusted prediction are left out of the recognition batch
+        predictor = self.ctx.predictor
+        predicted: dict[str, str] = {}
+        if predictor is not None:
+            for display in displays.values():
+                if display.skip_detect:
+                    continue
+
+                value = predictor.predict(0, display.name, self.ctx.time, display.get_image())
+                if value is not None:
+                    predicted[display.name] = value
+
+        recognize = [display for display in displays.values() if not display.name in predicted]
+        values = OCR().recognize_batch(self.ctx, [display.name for display in recognize], 
+                                       [display.get_image() for display in recognize])
+
+        lit: dict[str, Display] = {}
+        for display, (value, score) in zip(recognize, values):
+            # mode indicators only read when lit, same as the detector only finding lit text
+            if display.skip_detect:
+                if value != '' and score >= layout.min_score:
+                    lit[display.name] = display
+                continue
+
+            if score < layout.min_score:
+                _debug(self.ctx, lambda: print(f'{self.ctx.name}-{display.name}: low score {score}'))
+                return None
+
+            if predictor is not None:
+                predictor.update(0, display.name, self.ctx.time, value, display.get_image())
+
+            display.value = value
+            lit[display.name] = display
+
+        for name, value in predicted.items():
+            displays[name].value = value
+            lit[name] = displays[name]
+
+        res, failed = self.__panel_result(lit)
+        if failed:
+            return None
+
+        layout.hit()
+        self.displays = lit
+        return res
+
+    def detect_panel(self) -> Optional[Result]:
+        self.ctx._write_step(f'frame', self.ctx.image)
+
+        layout = self.ctx.layout
+        height, width = self.ctx.image.shape[:2]
+        # the layout of another rotation is kept for the attempt it was fitted at
+        if layout is not None and layout.valid() and layout.matches(self.ctx.rotation, width, height):
+            res = self.__detect_cached(layout)
+            if res is not None:
+                return res
+
+            print(f'{self.ctx.name} - cached panel layout failed, redetecting')
+            layout.reset()
+
+        results = OCR().detect_panel(self.ctx, self.ctx.image)
+        
+        def __debug_results():
+            layer = self.ctx._layer('paddle')
+            for res in results:
+                box = res.box
+                layer.rect(box, (0,255,0),1)
+                layer.text(f'{res.value}', [box[0], box[1] - 20], (0,255,0), 1, 2)
+
+
+        _debug(self.ctx, lambda: __debug_results())
+
+        displays = self.__detect_panel(results)
+
+        if not displays:
+            print('skywalker display not found')
+            return None
+
+        if not 'POWER' in displays:
+            print('skywalker power display not found')
+            return None
+
+        res, failed = self.__panel_result(displays)
+        if failed:
+            self.ctx.fail('failed to convert panel result')
+
+        # only cache the layout from a frame where every display was found and read
+        found = all(name in displays for name, section in self.__sections.items() if not section.skip_detect)
+        if layout is not None and found and not failed:
+            layout.update({key: disp.rect for key, disp in displays.items()}, self.ctx.rotation, width, height)
+
+        self.displays = displays
+        return res
+
+    def __detect_panel_cluster(self, processed_image, cluster: list, panel: int) -> Optional[Result]:
+        if self.ctx.options.panel:
+            displays = self.__detect_panel(cluster)
+        else:
+            displays = self.__match_displays(cluster, processed_image)
+
+        if not displays or not 'POWER' in displays:
+            print(f'{self.ctx.name} - skywalker panel {panel} not found')
+            return None
+
+        if self.ctx.options.panel:
+            res, failed = self.__panel_result(displays, panel)
+            if failed:
+                self.ctx.fail(f'failed to convert panel {panel} result')
+            return res
+
+        return self.__read_displays(displays, panel)
+
+    def detect_panels(self, count: int) -> list[Result]:
+        self.ctx._write_step(f'frame', self.ctx.image)
+
+        # one detection pass over the whole frame, then match and read each panel on its own
+        processed_image = None
+        if self.ctx.options.panel:
+            items = OCR().detect_panel(self.ctx, self.ctx.image)
+            rects = [Rect(item.box) for item in items]
+        else:
+            processed_image, items = self.__find_aois()
+            rects = [item.rect for item in items]
+
+        if len(items) == 0:
+            print('skywalker display not found')
+            return []
+
+        # a whole panel is linked through its power display, the farthest section sets the reach
+        ratio = max(MIN_LINK_RATIO, max([section.length for section in self.__sections.values()]) * 1.15)
+        groups = cluster_rects(rects, ratio)[:count]
+        clusters = [[items[idx] for idx in group] for group in groups]
+
+        # panels keep their index by position, not by the order they were found in
+        centers = [sum([rects[idx].center()[0] for idx in group]) / len(group) for group in groups]
+        if self.ctx.panels is not None:
+            panels = self.ctx.panels.assign(centers)
+        else:
+            panels = sorted(range(len(centers)), key=lambda idx: centers[idx])
+            panels = [panels.index(idx) for idx in range(len(centers))]
+
+        with ThreadPoolExecutor(max_workers=len(clusters)) as pool:
+            results = list(pool.map(lambda args: self.__detect_panel_cluster(processed_image, args[1], args[0]), 
+                                    zip(panels, clusters)))
+
+        return [res for res in results if res is not None]
+
+    def replay(self, frame: CachedFrame) -> Optional[Result]:
+        displays: dict[str, Display] = {}
+        for cached in frame.displays:
+            display = Display(self.ctx, cached.name, cached.rect, None, cached.image)
+            display.skip_detect = cached.skip_detect
+            displays[cached.name] = display
+
+        if not 'POWER' in displays:
+            print(f'{self.ctx.name} - cached power display not found')
+            return None
+
+        res = self.__read_displays(displays)
+
+        self.displays = displays
         return res
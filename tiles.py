@@ -0,0 +1,154 @@
+from typing import Optional, Tuple
+import cv2
+
+from utils import Rect, find_boxes
+
+TILE_SIZE = 64
+BRIGHT_THRESHOLD = 200
+# compression noise stays below this, a changed led or a camera shift does not
+DIFF_THRESHOLD = 24
+# above this share of changed tiles a full pass is cheaper
+FULL_RATIO = 0.5
+# the 10x10 dilation reaches 5 pixels, keep one more
+REACH = 6
+
+KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (10, 10))
+
+def threshold_gray(gray: cv2.Mat) -> cv2.Mat:
+    dilated_image = cv2.dilate(gray, KERNEL, iterations=1)
+
+    _, threshold_image = cv2.threshold(dilated_image, BRIGHT_THRESHOLD, 255, cv2.THRESH_BINARY)
+
+    return threshold_image
+
+def grow(rect: Rect, margin: int, width: int, height: int) -> Rect:
+    x, y = max(0, rect.x - margin), max(0, rect.y - margin)
+    x2, y2 = min(width, rect.x2() + margin), min(height, rect.y2() + margin)
+    return Rect([x, y, x2 - x, y2 - y])
+
+def union(rect1: Rect, rect2: Rect) -> Rect:
+    x, y = min(rect1.x, rect2.x), min(rect1.y, rect2.y)
+    return Rect([x, y, max(rect1.x2(), rect2.x2()) - x, max(rect1.y2(), rect2.y2()) - y])
+
+def touches(rect1: Rect, rect2: Rect) -> bool:
+    return rect1.x <= rect2.x2() and rect2.x <= rect1.x2() and \
+        rect1.y <= rect2.y2() and rect2.y <= rect1.y2()
+
+class TileState:
+    def __init__(self, gray: cv2.Mat, min_area: int):
+        self.min_area = min_area
+        # gray as of the last recompute of every pixel, slow drift still adds up to a change
+        self.gray = gray.copy()
+        self.threshold = threshold_gray(gray)
+        self.boxes = find_boxes(self.threshold, min_area)
+
+    def changed_regions(self, gray: cv2.Mat, tile_size: int) -> Optional[list[Rect]]:
+        height, width = gray.shape[:2]
+
+        _, changed = cv2.threshold(cv2.absdiff(gray, self.gray), DIFF_THRESHOLD, 255, cv2.THRESH_BINARY)
+
+        # a small change across the threshold still flips the binary image
+        _, bright = cv2.threshold(gray, BRIGHT_THRESHOLD, 255, cv2.THRESH_BINARY)
+        _, was_bright = cv2.threshold(self.gray, BRIGHT_THRESHOLD, 255, cv2.THRESH_BINARY)
+        changed = cv2.bitwise_or(changed, cv2.bitwise_xor(bright, was_bright))
+
+        rows, cols = -(-height // tile_size), -(-width // tile_size)
+        changed = cv2.copyMakeBorder(changed, 0, rows * tile_size - height, 0, cols * tile_size - width, cv2.BORDER_CONSTANT, 0)
+        tiles = changed.reshape(rows, tile_size, cols, tile_size).max(axis=(1, 3))
+
+        dirty = cv2.countNonZero(tiles)
+        if dirty > FULL_RATIO * rows * cols:
+            return None
+
+        # neighbouring changed tiles are recomputed as one region
+        count, _, stats, _ = cv2.connectedComponentsWithStats(tiles, connectivity=8)
+        regions = []
+        for x, y, w, h, _ in stats[1:count]:
+            rect = Rect([int(x) * tile_size, int(y) * tile_size, int(w) * tile_size, int(h) * tile_size])
+            regions.append(grow(rect, 0, width, height))
+
+        return regions
+
+    def update(self, gray: cv2.Mat, regions: list[Rect]) -> bool:
+        height, width = gray.shape[:2]
+
+        # changed pixels spread up to the dilation reach into the clean tiles around them
+        outputs = [grow(region, REACH, width, height) for region in regions]
+        for region, out in zip(regions, outputs):
+            src = grow(out, REACH, width, height)
+            part = threshold_gray(gray[src.y:src.y2(), src.x:src.x2()])
+            self.threshold[out.y:out.y2(), out.x:out.x2()] = part[out.y - src.y:out.y2() - src.y, out.x - src.x:out.x2() - src.x]
+            self.gray[region.y:region.y2(), region.x:region.x2()] = gray[region.y:region.y2(), region.x:region.x2()]
+
+        return self.__update_boxes(outputs, width, height)
+
+    def __update_boxes(self, outputs: list[Rect], width: int, height: int) -> bool:
+        # blobs touching a recomputed region are searched again as a whole, the rest are kept
+        searches = list(outputs)
+        kept = [Rect(box) for box in self.boxes]
+        merged = True
+        while merged:
+            merged = False
+            for idx, search in enumerate(searches):
+                for other in searches[idx + 1:]:
+                    if touches(search, other):
+                        searches[idx] = union(search, other)
+                        searches.remove(other)
+                        merged = True
+                        break
+                if merged:
+                    break
+
+                for box in kept:
+                    if touches(search, box):
+                        # one pixel past the blob so it does not end on the search edge
+                        searches[idx] = union(search, grow(box, 1, width, height))
+                        kept.remove(box)
+                        merged = True
+                        break
+                if merged:
+                    break
+
+        boxes = [box.to_list() for box in kept]
+        for search in searches:
+            found = find_boxes(self.threshold[search.y:search.y2(), search.x:search.x2()], self.min_area, (search.x, search.y))
+            for box in found:
+                rect = Rect(list(box))
+                # a blob cut by the search region, only a full search sees it whole
+                if (rect.x == search.x and search.x > 0) or (rect.y == search.y and search.y > 0) or \
+                    (rect.x2() == search.x2() and search.x2() < width) or (rect.y2() == search.y2() and search.y2() < height):
+                    return False
+
+            boxes.extend(found)
+
+        self.boxes = boxes
+        return True
+
+class TileTracker:
+    def __init__(self, tile_size: int = TILE_SIZE, min_area: int = 100):
+        self.tile_size = tile_size
+        self.min_area = min_area
+
+        self.frames = 0
+        self.full = 0
+        self.regions = 0
+
+        # one state per rotation, auto rotation would otherwise invalidate it every attempt
+        self.__states: dict[int, TileState] = {}
+
+    def preprocess(self, key: int, image: cv2.Mat) -> Tuple[cv2.Mat, list]:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        self.frames += 1
+
+        state = self.__states.get(key)
+        if state is not None and state.gray.shape == gray.shape:
+            regions = state.changed_regions(gray, self.tile_size)
+            if regions is not None and state.update(gray, regions):
+                self.regions += len(regions)
+                return state.threshold, state.boxes
+
+        self.full += 1
+        state = TileState(gray, self.min_area)
+        self.__states[key] = state
+
+        return state.threshold, state.boxes
@@ -5,11 +5,16 @@ import cv2
 import numpy as np
 
 class Rect:
+    # rects are not changed once built, the derived values are computed on first use
+    __slots__ = ('x', 'y', 'w', 'h', '_center', '_projected')
+
     def __init__(self, rect:list):
         self.x = rect[0]
         self.y = rect[1]
         self.w = rect[2]
         self.h = rect[3]
+        self._center = None
+        self._projected = None
 
     def x2(self) -> int:
         return self.x + self.w
@@ -21,7 +26,9 @@ class Rect:
         return self.w * self.h
 
     def center(self) -> Tuple[int, int]:
-        return (self.x + self.w // 2, self.y + self.h // 2)
+        if self._center is None:
+            self._center = (self.x + self.w // 2, self.y + self.h // 2)
+        return self._center
     
     def offset(self, rect):
         return Rect([self.x - rect.x, self.y - rect.y, self.w, self.h])
@@ -61,10 +68,12 @@ class Rect:
                 self.h == other.h
     
     def projected(self):
-        wmax = max(self.w, self.h * 2)
-        xmin = self.x + self.w - wmax
-        xmin = min(xmin, self.x)
-        return Rect([xmin ,self.y, wmax, self.h])
+        if self._projected is None:
+            wmax = max(self.w, self.h * 2)
+            xmin = self.x + self.w - wmax
+            xmin = min(xmin, self.x)
+            self._projected = Rect([xmin ,self.y, wmax, self.h])
+        return self._projected
     
     def extract_image(self, image: cv2.Mat) -> Optional[cv2.Mat]:
         image_height, image_width, _ = image.shape
@@ -80,8 +89,57 @@ class Rect:
             
 
 
+class RectArray:
+    # the Rect operations over n rects at once, one [x, y, w, h] row per rect
+    def __init__(self, rects: list[Rect] = None, boxes: np.ndarray = None):
+        if boxes is None:
+            boxes = [[rect.x, rect.y, rect.w, rect.h] for rect in rects or []]
+        self.boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 4)
+        self.__projected_centers = None
+
+    def __len__(self) -> int:
+        return len(self.boxes)
+
+    def centers(self) -> np.ndarray:
+        return self.boxes[:, :2] + self.boxes[:, 2:] // 2
+
+    def projected(self):
+        x, y, w, h = self.boxes.T
+        wmax = np.maximum(w, h * 2)
+        xmin = np.minimum(x + w - wmax, x)
+        return RectArray(boxes=np.stack([xmin, y, wmax, h], axis=1))
+
+    def projected_centers(self) -> np.ndarray:
+        # every section is matched against the same rects, project them once
+        if self.__projected_centers is None:
+            self.__projected_centers = self.projected().centers()
+        return self.__projected_centers
+
+def rotate_image(image: cv2.Mat, degree: int) -> cv2.Mat:
+    if degree == 90:
+        image = cv2.transpose(image)
+        image = cv2.flip(image, 1)
+    elif degree == 180:
+        image = cv2.flip(image, -1)
+    elif degree == 270:
+        image = cv2.transpose(image)
+        image = cv2.flip(image, 0)
+
+    return image
+
+def unrotate_rect(rect: Rect, degree: int, width: int, height: int) -> Rect:
+    # a box on the rotated image back on the original image of the given size
+    if degree == 90:
+        return Rect([rect.y, height - rect.x - rect.w, rect.h, rect.w])
+    elif degree == 180:
+        return Rect([width - rect.x - rect.w, height - rect.y - rect.h, rect.w, rect.h])
+    elif degree == 270:
+        return Rect([width - rect.y - rect.h, rect.x, rect.h, rect.w])
+
+    return rect
+
 def find_central_box_index(rects: list[Rect]):
-    centers = np.array([rect.center() for rect in rects])
+    centers = RectArray(rects).centers()
 
     centroid = np.mean(centers, axis=0)
 
@@ -100,14 +158,46 @@ def calculate_projection(rect: Rect, ratio: float, angle: float) -> Tuple[int, i
     return (int(px + dx), int(py + dy))
 
 def find_projection_rect_index(pt2: Tuple[int, int], rects: list[Rect]) -> Optional[int]:
-    px, py = pt2 
-    for i, rect in enumerate(rects):
-        x, y = rect.projected().center()
-        distance = int(math.sqrt((((px - x) ** 2) + ((py - y) ** 2))))
-        if distance <= (rect.h * 2):
-            return i
+    # the first rect with its projected center within twice its height
+    if not isinstance(rects, RectArray):
+        rects = RectArray(rects)
+
+    if len(rects) == 0:
+        return None
+
+    deltas = rects.projected_centers() - np.array(pt2)
+    distances = np.sqrt((deltas ** 2).sum(axis=1)).astype(np.int64)
+    found = np.flatnonzero(distances <= rects.boxes[:, 3] * 2)
+
+    return int(found[0]) if len(found) > 0 else None
+
+def cluster_rects(rects: list[Rect], ratio: float = 3.5) -> list[list[int]]:
+    # single link clusters, rects are linked when their centers are within ratio * height
+    parents = list(range(len(rects)))
 
-    return None
+    def find(i: int) -> int:
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    array = RectArray(rects)
+    centers = array.centers()
+    heights = array.boxes[:, 3]
+
+    deltas = centers[:, None, :] - centers[None, :, :]
+    distances = np.sqrt((deltas ** 2).sum(axis=2))
+    linked = np.triu(distances <= ratio * np.maximum(heights[:, None], heights[None, :]), k=1)
+
+    for i, j in zip(*np.nonzero(linked)):
+        parents[find(int(i))] = find(int(j))
+
+    clusters: dict[int, list[int]] = {}
+    for i in range(len(rects)):
+        clusters.setdefault(find(i), []).append(i)
+
+    # largest first, stray blobs end up in small clusters
+    return sorted(clusters.values(), key=lambda cluster: len(cluster), reverse=True)
 
 def calculate_angle(pt1, pt2):
     delta_x = pt2[0] - pt1[0]
@@ -242,3 +332,16 @@ def extract_box(image, box):
 
 def area(width: int, height: int) -> int:
     return width * height
+
+def find_boxes(image: cv2.Mat, minArea: int = 50, offset: tuple = (0, 0)) -> list:
+    def filter_area(contours):
+        for c in contours:
+            if cv2.contourArea(c) > minArea:
+                yield c
+
+    contours, _ = cv2.findContours( 
+        image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=offset) 
+
+    contours = filter_area(contours)
+
+    return [cv2.boundingRect(c) for c in contours]